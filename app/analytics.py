@@ -1,19 +1,59 @@
 import pandas as pd
 
+# Compact schema: kleinste dtype dat de waarden veilig bevat (geen overflow bij optellen)
+COMPACT_DTYPES = {
+    "champion": "category",
+    "puuid": "category",
+    "win": "int8",
+    "kills": "int16",
+    "deaths": "int16",
+    "assists": "int16",
+    "duration_s": "int32",
+    "jungle_cs": "int16",
+    "kp": "float32",
+    "dpm": "float32",
+    "gpm": "float32",
+    "team_dmg_pct": "float32",
+    "vision_score": "float32",
+    "kda": "float32",
+    "deaths_per_10": "float32",
+}
 
-def build_dataframe(records: list[dict]) -> pd.DataFrame:
+
+def build_dataframe(records: list[dict] | pd.DataFrame, compact: bool = False) -> pd.DataFrame:
+    """
+    records: lijst van extract_features dicts, of het DataFrame van extract_features_batch.
+    compact=True: COMPACT_DTYPES (categorical champion/puuid, kleinere ints/float32) en
+    game_datetime ook als index, zodat charts geen set_index kopie nodig hebben.
+    """
     df = pd.DataFrame(records)
 
     if df.empty:
         return df
 
+    if compact:
+        # int kolommen met ontbrekende waarden (bv. duration_s) als nullable Int
+        df = df.astype(
+            {
+                c: t.capitalize() if t.startswith("int") and df[c].isna().any() else t
+                for c, t in COMPACT_DTYPES.items() if c in df.columns
+            },
+            copy=False,
+        )
+
     # Converteer Unix ms timestamp naar echte datetime
     df["game_datetime"] = pd.to_datetime(df["game_creation"], unit="ms")
 
     df = df.sort_values("game_datetime")
 
+    if compact:
+        # naamloos: anders is "game_datetime" zowel index als kolom (ambigu in sort_values)
+        df.index = pd.DatetimeIndex(df["game_datetime"]).rename(None)
+
     # Rolling winrate
     df["winrate_roll10"] = df["win"].rolling(10, min_periods=3).mean()
+    if compact:
+        df["winrate_roll10"] = df["winrate_roll10"].astype("float32")
 
     return df
 
@@ -26,7 +66,7 @@ def champion_table(df: pd.DataFrame) -> pd.DataFrame:
         return df
 
     g = (
-        df.groupby("champion")
+        df.groupby("champion", observed=True)
         .agg(
             games=("win", "size"),
             winrate=("win", "mean"),
@@ -0,0 +1,204 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ratelimit import RateLimiter
+
+# Ranked solo/duo queue id
+QUEUE_RANKED = 420
+
+# Transient server/proxy errors die we opnieuw proberen
+RETRY_STATUS = (500, 502, 503, 504)
+
+
+class RiotHTTPError(RuntimeError):
+    """
+    Non-200 response na alle retries. permanent: 4xx (bv. 404 voor een verwijderde game),
+    opnieuw proberen heeft geen zin.
+    """
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def permanent(self) -> bool:
+        return 400 <= self.status < 500 and self.status != 429
+
+
+class RiotClient:
+    """
+    Gedeelde Riot API client voor dashboard, ingest en scripts.
+
+    - één pooled keep-alive Session per routing host (geen TCP+TLS handshake per request)
+    - dezelfde retry/backoff overal: netwerkfouten, 429 (Retry-After) en 5xx
+    - proactieve rate limiting via RateLimiter
+    - compress=True (default) laat requests gzip/deflate onderhandelen; False vraagt identity
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        routing: str = "europe",
+        timeout: float = 20,
+        max_retries: int = 7,
+        limiter: RateLimiter | None = None,
+        compress: bool = True,
+        pool_size: int = 16,
+    ):
+        self.api_key = api_key
+        self.routing = routing
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = limiter or RateLimiter()
+        self.compress = compress
+        self.pool_size = pool_size
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, host: str) -> requests.Session:
+        with self._lock:
+            s = self._sessions.get(host)
+            if s is None:
+                s = requests.Session()
+                s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+                s.headers["X-Riot-Token"] = self.api_key
+                if not self.compress:
+                    s.headers["Accept-Encoding"] = "identity"
+                self._sessions[host] = s
+            return s
+
+    def close(self):
+        with self._lock:
+            for s in self._sessions.values():
+                s.close()
+            self._sessions.clear()
+
+    def get(self, url: str, params=None) -> requests.Response:
+        """
+        GET met rate limiting en retries. Geeft de laatste response terug (ook bij non-200).
+        """
+        session = self._session(urlsplit(url).netloc)
+        backoff = 0.8  # start in seconds
+        r = None
+
+        for _ in range(self.max_retries):
+            self.limiter.acquire()
+            try:
+                r = session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException:
+                # network glitch: retry
+                time.sleep(backoff + random.random() * 0.2)
+                backoff = min(backoff * 1.8, 8)
+                continue
+
+            self.limiter.update(r.headers)
+
+            # Rate limit
+            if r.status_code == 429:
+                self.limiter.penalize(int(r.headers.get("Retry-After", "1")))
+                continue
+
+            if r.status_code in RETRY_STATUS:
+                time.sleep(backoff + random.random() * 0.2)
+                backoff = min(backoff * 1.8, 8)
+                continue
+
+            return r
+
+        if r is None:
+            raise RuntimeError(f"GET {url} failed: no response after {self.max_retries} attempts")
+        return r
+
+    def _url(self, path: str) -> str:
+        return f"https://{self.routing}.api.riotgames.com{path}"
+
+    def get_puuid(self, game_name: str, tag_line: str) -> str:
+        r = self.get(self._url(f"/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"))
+        if r.status_code != 200:
+            raise RuntimeError(f"get_puuid failed: {r.status_code} {r.text}")
+        return r.json()["puuid"]
+
+    def get_match_ids(
+        self,
+        puuid: str,
+        total: int = 100,
+        queue: int | None = QUEUE_RANKED,
+        start_time: int | None = None,
+        page_size: int = 100,
+    ) -> list[str]:
+        """
+        Match IDs (nieuwste eerst) met pagination (count max 100), tot total of tot een
+        pagina minder IDs teruggeeft dan gevraagd.
+        start_time (Unix seconds) beperkt tot games vanaf dat moment.
+        """
+        url = self._url(f"/lol/match/v5/matches/by-puuid/{puuid}/ids")
+
+        ids = []
+        start = 0
+        while len(ids) < total:
+            batch_count = min(page_size, 100, total - len(ids))
+            params = {"start": start, "count": batch_count}
+            if queue is not None:
+                params["queue"] = queue
+            if start_time is not None:
+                params["startTime"] = start_time
+
+            r = self.get(url, params=params)
+            if r.status_code != 200:
+                raise RuntimeError(f"get_match_ids failed: {r.status_code} {r.text}")
+
+            batch = r.json()
+            if not batch:
+                break
+
+            ids.extend(batch)
+            start += batch_count
+            if len(batch) < batch_count:
+                break
+
+        return ids
+
+    def get_match(self, match_id: str, store=None) -> dict:
+        """
+        Match v5 payload; met store wordt eerst de match store gelezen en alleen bij een miss gedownload.
+        """
+        if store is not None:
+            return store.get_or_fetch(match_id, self.get_match)
+
+        r = self.get(self._url(f"/lol/match/v5/matches/{match_id}"))
+        if r.status_code != 200:
+            raise RiotHTTPError(f"get_match failed for {match_id}: {r.status_code} {r.text}", r.status_code)
+        return r.json()
+
+    def get_matches(
+        self,
+        match_ids: list[str],
+        store=None,
+        max_workers: int = 8,
+        errors: dict | None = None,
+    ) -> tuple[list[dict | None], int]:
+        """
+        Haalt matches parallel op (thread pool achter de rate limiter).
+        errors: optioneel dict dat gevuld wordt met match_id -> exception voor gefaalde matches.
+        Returns: (matches in dezelfde volgorde als match_ids, None bij falen; aantal gefaalde matches)
+        """
+        def fetch(mid):
+            try:
+                return self.get_match(mid, store=store)
+            except Exception as e:
+                if errors is not None:
+                    errors[mid] = e
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            matches = list(pool.map(fetch, match_ids))
+
+        failed = sum(1 for m in matches if m is None)
+        return matches, failed
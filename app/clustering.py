@@ -1,6 +1,12 @@
+import hashlib
+
+import numpy as np
 import pandas as pd
+from scipy.optimize import linear_sum_assignment
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from .registry import ModelRegistry
 
 CLUSTER_FEATURES = [
     "kp",
@@ -11,25 +17,37 @@ CLUSTER_FEATURES = [
     "team_dmg_pct",
 ]
 
+# K waarden die het dashboard aanbiedt; ontbrekende modellen worden samen gefit
+K_OPTIONS = (3, 4, 5)
 
-def cluster_playstyles(df: pd.DataFrame, k: int = 4):
-    if df is None or df.empty:
-        return None, None
+# Vanaf dit aantal games MiniBatchKMeans i.p.v. KMeans (multi-player datasets)
+MINIBATCH_THRESHOLD = 20000
 
-    d = df.dropna(subset=["win"]).copy()
+# Refit als nieuwe games gemiddeld zoveel verder van hun centroid liggen dan bij de fit
+DRIFT_THRESHOLD = 1.5
+DRIFT_MIN_GAMES = 10
 
-    if len(d) < max(20, k * 5):
-        return None, None
 
-    X = d[CLUSTER_FEATURES].fillna(0)
+def _kmeans(Xs: np.ndarray, k: int, init: np.ndarray | None = None):
+    """
+    init: centroids (geschaald) van een vorige fit => warm start met één init i.p.v. 20.
+    """
+    if len(Xs) >= MINIBATCH_THRESHOLD:
+        if init is not None:
+            return MiniBatchKMeans(n_clusters=k, init=init, n_init=1, batch_size=4096, random_state=42)
+        return MiniBatchKMeans(n_clusters=k, n_init=3, batch_size=4096, random_state=42)
 
-    scaler = StandardScaler()
-    Xs = scaler.fit_transform(X)
+    if init is not None:
+        return KMeans(n_clusters=k, init=init, n_init=1, random_state=42)
+    return KMeans(n_clusters=k, random_state=42, n_init=20)
 
-    km = KMeans(n_clusters=k, random_state=42, n_init=20)
-    d["cluster"] = km.fit_predict(Xs)
 
-    cluster_summary = (
+def _features(d: pd.DataFrame) -> np.ndarray:
+    return d[CLUSTER_FEATURES].fillna(0).to_numpy(dtype=float)
+
+
+def _summarize(d: pd.DataFrame) -> pd.DataFrame:
+    return (
         d.groupby("cluster")
         .agg(
             games=("win", "size"),
@@ -45,6 +63,8 @@ def cluster_playstyles(df: pd.DataFrame, k: int = 4):
         .reset_index()
     )
 
+
+def _style_names(cluster_summary: pd.DataFrame) -> dict:
     def interpret_style(row):
         if row["avg_gpm"] > cluster_summary["avg_gpm"].mean() and row["avg_deaths10"] < cluster_summary["avg_deaths10"].mean():
             return "Tempo / Farm Control"
@@ -56,9 +76,162 @@ def cluster_playstyles(df: pd.DataFrame, k: int = 4):
             return "High Risk / Aggressive"
         return "Balanced"
 
-    cluster_summary["style_name"] = cluster_summary.apply(interpret_style, axis=1)
+    return dict(zip(cluster_summary["cluster"], cluster_summary.apply(interpret_style, axis=1)))
+
+
+class PlaystyleModel:
+    """
+    Persistente clustering: scaler + centroids + style-naam per cluster + label per match.
+
+    - assign() labelt nieuwe games tegen de bestaande centroids (O(k) per game), zonder refit
+    - fit() alleen op verzoek of bij drift; warm start vanaf de vorige centroids en
+      Hungarian matching op de oude centroids houdt cluster IDs (en hun namen) stabiel
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.scaler = None
+        self.centers = None      # geschaald, shape (k, n_features)
+        self.style_map = {}
+        self.labels = {}         # match_id -> cluster
+        self.n_fit = 0
+        self.fit_msd = 0.0       # gemiddelde kwadratische afstand tot de centroid bij de fit
+        self.new_games = 0
+        self.new_sq_dist = 0.0
+
+    def fit(self, d: pd.DataFrame) -> "PlaystyleModel":
+        X = _features(d)
+        scaler = StandardScaler()
+        Xs = scaler.fit_transform(X)
+
+        prev_centers = None
+        if self.centers is not None:
+            # oude centroids via feature-ruimte naar de nieuwe scaler
+            prev_centers = scaler.transform(self.scaler.inverse_transform(self.centers))
+
+        km = _kmeans(Xs, self.k, prev_centers)
+        labels = km.fit_predict(Xs)
+        centers = km.cluster_centers_
+
+        if prev_centers is not None:
+            # nieuwe cluster j krijgt het ID van de dichtstbijzijnde oude centroid
+            cost = ((centers[:, None, :] - prev_centers[None, :, :]) ** 2).sum(axis=2)
+            rows, cols = linear_sum_assignment(cost)
+            perm = np.empty(self.k, dtype=int)
+            perm[rows] = cols
+            labels = perm[labels]
+            centers = centers[np.argsort(perm)]
+
+        self.scaler = scaler
+        self.centers = centers
+        self.labels = dict(zip(d["match_id"], labels.tolist()))
+        self.n_fit = len(d)
+        self.fit_msd = float(km.inertia_) / max(len(d), 1)
+        self.new_games = 0
+        self.new_sq_dist = 0.0
+
+        if not self.style_map:
+            self.style_map = _style_names(_summarize(d.assign(cluster=labels)))
+        return self
+
+    def assign(self, d: pd.DataFrame) -> np.ndarray:
+        """
+        Labelt games tegen de bestaande centroids en houdt drift bij.
+        """
+        if d.empty:
+            return np.empty(0, dtype=int)
+
+        Xs = self.scaler.transform(_features(d))
+        dist = ((Xs[:, None, :] - self.centers[None, :, :]) ** 2).sum(axis=2)
+        labels = dist.argmin(axis=1)
+
+        self.labels.update(zip(d["match_id"], labels.tolist()))
+        self.new_games += len(d)
+        self.new_sq_dist += float(dist.min(axis=1).sum())
+        return labels
+
+    def drift(self) -> float:
+        """
+        Gemiddelde kwadratische afstand van nieuwe games / die bij de fit (1.0 = geen drift).
+        """
+        if not self.new_games or not self.fit_msd:
+            return 1.0
+        return (self.new_sq_dist / self.new_games) / self.fit_msd
+
+    def needs_refit(self) -> bool:
+        # ook als de history sinds de fit verdubbeld is
+        if self.new_games >= max(self.n_fit, DRIFT_MIN_GAMES):
+            return True
+        return self.new_games >= DRIFT_MIN_GAMES and self.drift() > DRIFT_THRESHOLD
+
+
+def _model_key(scope: str, k: int) -> str:
+    return "playstyle-" + hashlib.sha256(f"{scope}|{k}|{','.join(CLUSTER_FEATURES)}".encode()).hexdigest()
+
+
+def playstyle_model(
+    d: pd.DataFrame,
+    k: int,
+    registry: ModelRegistry | None = None,
+    scope: str = "",
+    refit: bool = False,
+) -> PlaystyleModel:
+    """
+    Bestaand model uit de registry bijwerken: alleen nieuwe games worden ge-assigned;
+    refit bij refit=True of drift. Ontbrekende modellen voor K_OPTIONS worden samen gefit.
+    """
+    if registry is None:
+        return PlaystyleModel(k).fit(d)
+
+    key = _model_key(scope, k)
+    model = registry.get(key)
+
+    if model is None:
+        for kk in sorted({k, *K_OPTIONS}):
+            if len(d) < max(20, kk * 5) or (kk != k and registry.get(_model_key(scope, kk)) is not None):
+                continue
+            registry.put(_model_key(scope, kk), PlaystyleModel(kk).fit(d))
+        return registry.get(key)
+
+    new = d[~d["match_id"].isin(model.labels)]
+    if refit:
+        model.fit(d)
+    elif not new.empty:
+        model.assign(new)
+        if model.needs_refit():
+            model.fit(d)
+    else:
+        return model
+
+    registry.put(key, model)
+    return model
+
+
+def cluster_playstyles(
+    df: pd.DataFrame,
+    k: int = 4,
+    registry: ModelRegistry | None = None,
+    scope: str = "",
+    refit: bool = False,
+):
+    """
+    Met een registry wordt het opgeslagen PlaystyleModel per (scope, K) hergebruikt, zodat
+    labels en style-namen stabiel blijven. scope onderscheidt spelers (bv. de puuid).
+    """
+    if df is None or df.empty:
+        return None, None
+
+    d = df.dropna(subset=["win"])
+
+    if len(d) < max(20, k * 5):
+        return None, None
+
+    model = playstyle_model(d, k, registry=registry, scope=scope, refit=refit)
+    # assign: dropna kan (zonder NaN) een view op df teruggeven, df zelf blijft ongewijzigd
+    cluster = d["match_id"].map(model.labels)
+    d = d.assign(cluster=cluster, style_name=cluster.map(model.style_map))
 
-    label_map = dict(zip(cluster_summary["cluster"], cluster_summary["style_name"]))
-    d["style_name"] = d["cluster"].map(label_map)
+    cluster_summary = _summarize(d)
+    cluster_summary["style_name"] = cluster_summary["cluster"].map(model.style_map)
 
     return d, cluster_summary
@@ -0,0 +1,619 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .features import FEATURE_VERSION, extract_features
+
+DB_PATH = "lol.db"
+
+# Ranked solo/duo queue id
+QUEUE_RANKED = 420
+
+# Feature kolommen in participant_stats (naast win/kills/deaths/assists) → SQL type
+FEATURE_COLUMNS = {
+    "duration_s": "INTEGER",
+    "kp": "REAL",
+    "dpm": "REAL",
+    "gpm": "REAL",
+    "team_dmg_pct": "REAL",
+    "vision_score": "REAL",
+    "jungle_cs": "INTEGER",
+    "kda": "REAL",
+    "deaths_per_10": "REAL",
+}
+
+
+def init_schema(con):
+    """
+    Maakt tabellen aan en migreert bestaande databases (ontbrekende kolommen toevoegen).
+    """
+    # WAL (persistent in het bestand): lezers (API pool, lange exports) en de schrijver
+    # (sync daemon, ingest, dashboard) blokkeren elkaar niet, net als de match store
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS players (
+      puuid TEXT PRIMARY KEY,
+      game_name TEXT NOT NULL,
+      tag_line TEXT NOT NULL
+    );
+    """)
+
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS matches (
+      match_id TEXT PRIMARY KEY,
+      queue_id INTEGER,
+      game_creation INTEGER,
+      game_duration INTEGER
+    );
+    """)
+
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS participant_stats (
+      match_id TEXT NOT NULL,
+      puuid TEXT NOT NULL,
+      champion_name TEXT,
+      win INTEGER,
+      kills INTEGER,
+      deaths INTEGER,
+      assists INTEGER,
+      lane TEXT,
+      role TEXT,
+      PRIMARY KEY (match_id, puuid),
+      FOREIGN KEY (match_id) REFERENCES matches(match_id),
+      FOREIGN KEY (puuid) REFERENCES players(puuid)
+    );
+    """)
+
+    have = {r[1] for r in con.execute("PRAGMA table_info(participant_stats)")}
+    for col, sql_type in {**FEATURE_COLUMNS, "feature_version": "INTEGER"}.items():
+        if col not in have:
+            con.execute(f"ALTER TABLE participant_stats ADD COLUMN {col} {sql_type}")
+
+    # queue_id/game_creation gedenormaliseerd uit matches, zodat per-speler queries
+    # zonder join via één index lopen
+    if "queue_id" not in have:
+        con.execute("ALTER TABLE participant_stats ADD COLUMN queue_id INTEGER")
+        con.execute("ALTER TABLE participant_stats ADD COLUMN game_creation INTEGER")
+        con.execute("""
+            UPDATE participant_stats
+            SET queue_id = (SELECT m.queue_id FROM matches m WHERE m.match_id = participant_stats.match_id),
+                game_creation = (SELECT m.game_creation FROM matches m WHERE m.match_id = participant_stats.match_id)
+        """)
+
+    # Covering index voor "laatste N games van speler X in queue Y"
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_ps_puuid_queue_creation
+    ON participant_stats(puuid, queue_id, game_creation, win, kills, deaths, assists, champion_name)
+    """)
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_matches_queue_creation
+    ON matches(queue_id, game_creation)
+    """)
+
+    _init_summary(con)
+
+    # data_version: door elke ingest-write opgehoogd; de API gebruikt hem voor ETags/cache keys
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS meta (
+      key TEXT PRIMARY KEY,
+      value INTEGER NOT NULL
+    );
+    """)
+    con.execute("INSERT OR IGNORE INTO meta(key, value) VALUES ('data_version', 0)")
+
+    # Laatste sync per speler (app.sync)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS sync_state (
+      puuid TEXT PRIMARY KEY,
+      last_sync INTEGER,
+      last_new_game INTEGER,
+      next_poll INTEGER,
+      interval_s INTEGER,
+      games_added INTEGER NOT NULL DEFAULT 0,
+      last_error TEXT
+    );
+    """)
+    # aantal games van de speler bij de laatste poll (nieuwe games tellen ongeacht welke poll ze schreef)
+    if "games" not in {r[1] for r in con.execute("PRAGMA table_info(sync_state)")}:
+        con.execute("ALTER TABLE sync_state ADD COLUMN games INTEGER")
+
+    # Matches die niet opgehaald konden worden; sync/dashboard proberen ze opnieuw
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS failed_matches (
+      puuid TEXT NOT NULL,
+      match_id TEXT NOT NULL,
+      attempts INTEGER NOT NULL DEFAULT 0,
+      permanent INTEGER NOT NULL DEFAULT 0,
+      last_error TEXT,
+      last_attempt INTEGER,
+      PRIMARY KEY (puuid, match_id)
+    );
+    """)
+
+    # Incrementele tilt staat per speler (app.tilt.TiltTracker); level/score los voor alerting
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS tilt_state (
+      puuid TEXT PRIMARY KEY,
+      state TEXT NOT NULL,
+      games INTEGER NOT NULL,
+      level TEXT,
+      score INTEGER,
+      result TEXT,
+      updated_at INTEGER NOT NULL
+    );
+    """)
+
+
+def data_version(con) -> int:
+    row = con.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_version(con):
+    """
+    Markeert dat de data veranderd is. Aanroepen binnen de schrijvende transactie.
+    """
+    con.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+
+
+def _init_summary(con):
+    """
+    champion_stats: games/wins/K/D/A per puuid × queue × champion. Triggers op
+    participant_stats houden de tabel bij in dezelfde transactie als de ingest.
+    """
+    exists = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'champion_stats'"
+    ).fetchone()
+
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS champion_stats (
+      puuid TEXT NOT NULL,
+      queue_id INTEGER NOT NULL,
+      champion_name TEXT NOT NULL,
+      games INTEGER NOT NULL,
+      wins INTEGER NOT NULL,
+      kills INTEGER NOT NULL,
+      deaths INTEGER NOT NULL,
+      assists INTEGER NOT NULL,
+      PRIMARY KEY (puuid, queue_id, champion_name)
+    ) WITHOUT ROWID;
+    """)
+
+    con.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_ps_insert_summary
+    AFTER INSERT ON participant_stats
+    BEGIN
+      INSERT INTO champion_stats(puuid, queue_id, champion_name, games, wins, kills, deaths, assists)
+      VALUES (NEW.puuid, NEW.queue_id, NEW.champion_name, 1, NEW.win, NEW.kills, NEW.deaths, NEW.assists)
+      ON CONFLICT(puuid, queue_id, champion_name) DO UPDATE SET
+        games = games + 1,
+        wins = wins + excluded.wins,
+        kills = kills + excluded.kills,
+        deaths = deaths + excluded.deaths,
+        assists = assists + excluded.assists;
+    END;
+    """)
+
+    con.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_ps_delete_summary
+    AFTER DELETE ON participant_stats
+    BEGIN
+      UPDATE champion_stats SET
+        games = games - 1,
+        wins = wins - OLD.win,
+        kills = kills - OLD.kills,
+        deaths = deaths - OLD.deaths,
+        assists = assists - OLD.assists
+      WHERE puuid = OLD.puuid AND queue_id = OLD.queue_id AND champion_name = OLD.champion_name;
+      DELETE FROM champion_stats
+      WHERE puuid = OLD.puuid AND queue_id = OLD.queue_id AND champion_name = OLD.champion_name AND games <= 0;
+    END;
+    """)
+
+    # Een recompute kan champion/win/K/D/A wijzigen: oude bijdrage eraf, nieuwe erbij
+    con.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_ps_update_summary
+    AFTER UPDATE OF champion_name, queue_id, win, kills, deaths, assists ON participant_stats
+    BEGIN
+      UPDATE champion_stats SET
+        games = games - 1,
+        wins = wins - OLD.win,
+        kills = kills - OLD.kills,
+        deaths = deaths - OLD.deaths,
+        assists = assists - OLD.assists
+      WHERE puuid = OLD.puuid AND queue_id = OLD.queue_id AND champion_name = OLD.champion_name;
+      DELETE FROM champion_stats
+      WHERE puuid = OLD.puuid AND queue_id = OLD.queue_id AND champion_name = OLD.champion_name AND games <= 0;
+      INSERT INTO champion_stats(puuid, queue_id, champion_name, games, wins, kills, deaths, assists)
+      VALUES (NEW.puuid, NEW.queue_id, NEW.champion_name, 1, NEW.win, NEW.kills, NEW.deaths, NEW.assists)
+      ON CONFLICT(puuid, queue_id, champion_name) DO UPDATE SET
+        games = games + 1,
+        wins = wins + excluded.wins,
+        kills = kills + excluded.kills,
+        deaths = deaths + excluded.deaths,
+        assists = assists + excluded.assists;
+    END;
+    """)
+
+    if not exists:
+        # bestaande database: summary eenmalig opbouwen
+        con.execute("""
+            INSERT INTO champion_stats(puuid, queue_id, champion_name, games, wins, kills, deaths, assists)
+            SELECT puuid, queue_id, champion_name, COUNT(*), SUM(win), SUM(kills), SUM(deaths), SUM(assists)
+            FROM participant_stats
+            WHERE queue_id IS NOT NULL AND champion_name IS NOT NULL
+            GROUP BY puuid, queue_id, champion_name
+        """)
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    con = sqlite3.connect(path, timeout=30)
+    con.row_factory = sqlite3.Row
+    return con
+
+
+class ReadOnlyPool:
+    """
+    Pool van read-only connecties (mode=ro) voor de API: geen open/close + schema parse
+    per request, en de statement cache van sqlite3 blijft per connectie warm.
+    """
+
+    def __init__(
+        self,
+        path: str = DB_PATH,
+        size: int = 8,
+        cache_size_kib: int = 16384,
+        mmap_size: int = 256 * 1024 * 1024,
+    ):
+        self.path = path
+        self.size = size
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        con = sqlite3.connect(
+            f"file:{self.path}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        con.row_factory = sqlite3.Row
+        con.execute(f"PRAGMA cache_size = -{self.cache_size_kib}")
+        con.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        con.execute("PRAGMA query_only = 1")
+        return con
+
+    @contextmanager
+    def connection(self):
+        try:
+            con = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = len(self._all) < self.size
+                if can_open:
+                    con = self._open()
+                    self._all.append(con)
+            if not can_open:
+                con = self._idle.get()
+
+        try:
+            yield con
+        finally:
+            self._idle.put(con)
+
+    def close(self):
+        with self._lock:
+            for con in self._all:
+                con.close()
+            self._all.clear()
+            self._idle = queue.LifoQueue()
+
+
+def find_puuid(con, game_name: str, tag_line: str) -> str | None:
+    row = con.execute(
+        "SELECT puuid FROM players WHERE game_name = ? AND tag_line = ?",
+        (game_name, tag_line),
+    ).fetchone()
+    return row["puuid"] if row else None
+
+
+def upsert_player(con, puuid: str, game_name: str, tag_line: str):
+    """
+    Data version alleen omhoog als de speler nieuw is of zijn Riot ID veranderd is,
+    anders invalideert elke refresh de caches voor niets.
+    """
+    before = con.total_changes
+    con.execute(
+        """INSERT INTO players(puuid, game_name, tag_line) VALUES (?, ?, ?)
+           ON CONFLICT(puuid) DO UPDATE SET game_name = excluded.game_name, tag_line = excluded.tag_line
+           WHERE game_name != excluded.game_name OR tag_line != excluded.tag_line""",
+        (puuid, game_name, tag_line),
+    )
+    if con.total_changes != before:
+        bump_data_version(con)
+
+
+def latest_game_creation(con, puuid: str, queue_id: int = QUEUE_RANKED) -> int | None:
+    """
+    Unix ms timestamp van de nieuwste opgeslagen game van deze speler (of None).
+    """
+    row = con.execute("""
+        SELECT MAX(game_creation) AS latest
+        FROM participant_stats
+        WHERE puuid = ? AND queue_id = ?
+    """, (puuid, queue_id)).fetchone()
+    return row["latest"]
+
+
+def _stat_row(match_json: dict, puuid: str) -> tuple | None:
+    me = next((p for p in match_json["info"]["participants"] if p["puuid"] == puuid), None)
+    rec = extract_features(match_json, puuid)
+    if rec is None:
+        return None
+
+    return (
+        rec["match_id"],
+        puuid,
+        match_json["info"].get("queueId"),
+        rec["game_creation"],
+        rec["champion"],
+        rec["win"],
+        rec["kills"],
+        rec["deaths"],
+        rec["assists"],
+        me.get("lane"),
+        me.get("role"),
+        *(rec[c] for c in FEATURE_COLUMNS),
+        FEATURE_VERSION,
+    )
+
+
+_STAT_COLUMNS = [
+    "match_id", "puuid", "queue_id", "game_creation", "champion_name", "win", "kills", "deaths", "assists", "lane", "role",
+    *FEATURE_COLUMNS, "feature_version",
+]
+
+
+def missing_player_matches(con, puuid: str, match_ids: list[str]) -> list[str]:
+    """
+    Match IDs waarvoor deze speler nog geen participant_stats rij heeft (volgorde blijft behouden).
+    Een match kan al in `matches` staan via een andere getrackte speler.
+    """
+    rows = con.execute(
+        "SELECT match_id FROM participant_stats WHERE puuid = ? AND match_id IN (SELECT value FROM json_each(?))",
+        (puuid, json.dumps(match_ids)),
+    )
+    have = {r[0] for r in rows}
+    return [mid for mid in match_ids if mid not in have]
+
+
+def list_players(con) -> list[dict]:
+    return [dict(r) for r in con.execute("SELECT puuid, game_name, tag_line FROM players ORDER BY game_name")]
+
+
+def sync_states(con) -> dict[str, dict]:
+    return {r["puuid"]: dict(r) for r in con.execute("SELECT * FROM sync_state")}
+
+
+def save_sync_state(con, state: dict):
+    con.execute(
+        """INSERT OR REPLACE INTO sync_state(
+               puuid, last_sync, last_new_game, next_poll, interval_s, games_added, last_error, games
+           ) VALUES (:puuid, :last_sync, :last_new_game, :next_poll, :interval_s, :games_added, :last_error, :games)""",
+        {"games": None, **state},
+    )
+
+
+# Na zoveel mislukte pogingen wordt een match niet meer opnieuw geprobeerd
+MAX_FETCH_ATTEMPTS = 5
+
+
+def record_failed_matches(con, puuid: str, errors: dict):
+    """
+    errors: match_id -> exception (RiotClient.get_matches). Permanente fouten (4xx)
+    worden niet opnieuw geprobeerd.
+    """
+    now = int(time.time())
+    con.executemany(
+        """INSERT INTO failed_matches(puuid, match_id, attempts, permanent, last_error, last_attempt)
+           VALUES (?, ?, 1, ?, ?, ?)
+           ON CONFLICT(puuid, match_id) DO UPDATE SET
+             attempts = attempts + 1,
+             permanent = excluded.permanent,
+             last_error = excluded.last_error,
+             last_attempt = excluded.last_attempt""",
+        [
+            (puuid, mid, int(getattr(e, "permanent", False)), str(e)[:500], now)
+            for mid, e in errors.items()
+        ],
+    )
+
+
+def retry_match_ids(con, puuid: str, max_attempts: int = MAX_FETCH_ATTEMPTS) -> list[str]:
+    """Eerder gefaalde matches van puuid die nog een poging krijgen."""
+    return [
+        r[0]
+        for r in con.execute(
+            "SELECT match_id FROM failed_matches WHERE puuid = ? AND permanent = 0 AND attempts < ?",
+            (puuid, max_attempts),
+        )
+    ]
+
+
+def clear_failed_matches(con, puuid: str, match_ids: list[str]):
+    con.executemany(
+        "DELETE FROM failed_matches WHERE puuid = ? AND match_id = ?",
+        [(puuid, mid) for mid in match_ids],
+    )
+
+
+def load_tilt_state(con, puuid: str) -> dict | None:
+    row = con.execute("SELECT state FROM tilt_state WHERE puuid = ?", (puuid,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def save_tilt_state(con, puuid: str, state: dict, result: dict | None):
+    con.execute(
+        """INSERT OR REPLACE INTO tilt_state(puuid, state, games, level, score, result, updated_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (
+            puuid,
+            json.dumps(state),
+            state["n"],
+            result["level"] if result else None,
+            result["score"] if result else None,
+            json.dumps(result) if result else None,
+            int(time.time()),
+        ),
+    )
+    bump_data_version(con)
+
+
+def feature_rows_since(con, puuid: str, since: int | None, queue_id: int = QUEUE_RANKED) -> list[dict]:
+    """
+    Tilt-input (win, kda, deaths_per_10) van games na since (game_creation, ms), oudste eerst.
+    Alleen rijen met actuele features, net als load_feature_records.
+    """
+    cur = con.execute(
+        """SELECT game_creation, win, kda, deaths_per_10
+           FROM participant_stats
+           WHERE puuid = ? AND queue_id = ? AND game_creation > ? AND feature_version = ?
+           ORDER BY game_creation""",
+        (puuid, queue_id, since if since is not None else -1, FEATURE_VERSION),
+    )
+    cols = [c[0] for c in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def count_player_games(con, puuid: str, queue_id: int = QUEUE_RANKED) -> int:
+    # alleen rijen met actuele features; recompute_features verhoogt dit dus ook
+    return con.execute(
+        "SELECT COUNT(*) FROM participant_stats WHERE puuid = ? AND queue_id = ? AND feature_version = ?",
+        (puuid, queue_id, FEATURE_VERSION),
+    ).fetchone()[0]
+
+
+def load_roster_tilt_frame(con, window: int, queue_id: int = QUEUE_RANKED) -> list[dict]:
+    """
+    Tilt-input voor alle spelers in de roster: de laatste `window` games per speler
+    (ROW_NUMBER over idx_ps_puuid_queue_creation) + hun totaal aantal games.
+    """
+    rows = con.execute("""
+        SELECT puuid, game_name, tag_line, game_creation, win, kda, deaths_per_10, games
+        FROM (
+            SELECT ps.puuid, p.game_name, p.tag_line, ps.game_creation, ps.win, ps.kda, ps.deaths_per_10,
+                   ROW_NUMBER() OVER (PARTITION BY ps.puuid ORDER BY ps.game_creation DESC) AS rn,
+                   COUNT(*) OVER (PARTITION BY ps.puuid) AS games
+            FROM participant_stats ps
+            JOIN players p ON p.puuid = ps.puuid
+            WHERE ps.queue_id = ? AND ps.feature_version = ?
+        )
+        WHERE rn <= ?
+    """, (queue_id, FEATURE_VERSION, window)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def insert_matches(con, matches: list[dict], puuids: str | set[str], queue_id: int = QUEUE_RANKED) -> int:
+    """
+    Schrijft matches + participant_stats (incl. feature kolommen) weg voor elke getrackte
+    puuid die in de match meedeed. Commit is aan de caller.
+    Returns: aantal nieuw opgeslagen matches.
+    """
+    if isinstance(puuids, str):
+        puuids = {puuids}
+
+    match_rows = []
+    stat_rows = []
+
+    for match_json in matches:
+        info = match_json["info"]
+
+        # Sanity: queueId moet kloppen (we filteren al, maar extra zekerheid)
+        if info.get("queueId") != queue_id:
+            continue
+
+        match_id = match_json["metadata"]["matchId"]
+        match_rows.append((match_id, info.get("queueId"), info.get("gameCreation"), info.get("gameDuration")))
+
+        for p in info["participants"]:
+            if p["puuid"] in puuids:
+                stat_rows.append(_stat_row(match_json, p["puuid"]))
+
+    cur = con.executemany(
+        "INSERT OR IGNORE INTO matches(match_id, queue_id, game_creation, game_duration) VALUES (?, ?, ?, ?)",
+        match_rows,
+    )
+    inserted = cur.rowcount
+    cur = con.executemany(
+        f"INSERT OR IGNORE INTO participant_stats({', '.join(_STAT_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(_STAT_COLUMNS))})",
+        stat_rows,
+    )
+    if inserted or cur.rowcount:
+        bump_data_version(con)
+    return inserted
+
+
+def stale_feature_rows(con, puuid: str | None = None) -> list[tuple[str, str]]:
+    """
+    (match_id, puuid) paren waarvan de features ontbreken of door een oudere extractor zijn berekend.
+    """
+    sql = """
+        SELECT match_id, puuid FROM participant_stats
+        WHERE (feature_version IS NULL OR feature_version < ?)
+    """
+    params = [FEATURE_VERSION]
+    if puuid is not None:
+        sql += " AND puuid = ?"
+        params.append(puuid)
+    return [(r[0], r[1]) for r in con.execute(sql, params)]
+
+
+def recompute_features(con, rows: list[tuple[str, str]], matches: dict[str, dict]) -> int:
+    """
+    Herberekent feature kolommen voor (match_id, puuid) uit de ruwe match JSON.
+    matches: match_id -> payload, vooraf opgehaald (buiten de transactie); rijen zonder
+    payload worden overgeslagen. Commit is aan de caller.
+    """
+    updates = []
+    for match_id, puuid in rows:
+        if match_id not in matches:
+            continue
+        row = _stat_row(matches[match_id], puuid)
+        if row is None:
+            continue
+        # alles behalve match_id/puuid, dan de key voor de WHERE
+        updates.append((*row[2:], match_id, puuid))
+
+    cols = _STAT_COLUMNS[2:]
+    con.executemany(
+        f"UPDATE participant_stats SET {', '.join(c + ' = ?' for c in cols)} "
+        "WHERE match_id = ? AND puuid = ?",
+        updates,
+    )
+    if updates:
+        bump_data_version(con)
+    return len(updates)
+
+
+def load_feature_records(con, puuid: str, queue_id: int = QUEUE_RANKED, limit: int | None = None) -> list[dict]:
+    """
+    Records in de vorm van app.features.extract_features, rechtstreeks uit SQLite (nieuwste eerst).
+    """
+    rows = con.execute(f"""
+        SELECT match_id, game_creation, champion_name AS champion,
+               win, kills, deaths, assists,
+               {', '.join(FEATURE_COLUMNS)}
+        FROM participant_stats
+        WHERE puuid = ? AND queue_id = ? AND feature_version = ?
+        ORDER BY game_creation DESC
+        LIMIT ?
+    """, (puuid, queue_id, FEATURE_VERSION, -1 if limit is None else limit)).fetchall()
+    return [dict(r) for r in rows]
@@ -1,3 +1,20 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # snellere parser is optioneel
+    orjson = None
+
+# Verhoog bij elke wijziging in extract_features: opgeslagen rijen met een oudere versie
+# worden dan opnieuw berekend uit de ruwe match JSON (match store)
+FEATURE_VERSION = 1
+
+
 def find_participant(match_json: dict, puuid: str):
     for p in match_json["info"]["participants"]:
         if p["puuid"] == puuid:
@@ -34,6 +51,136 @@ def extract_features(match_json: dict, puuid: str) -> dict | None:
     }
 
     record["kda"] = (record["kills"] + record["assists"]) / max(record["deaths"], 1)
-    record["deaths_per_10"] = (record["deaths"] / max(record["duration_s"], 1)) * 600
+    # zonder gameDuration geen rate (None, zoals game_creation/duration_s zelf)
+    if record["duration_s"] is None:
+        record["deaths_per_10"] = None
+    else:
+        record["deaths_per_10"] = (record["deaths"] / max(record["duration_s"], 1)) * 600
 
     return record
+
+
+# Kolommen (en dtypes) van extract_features, in dezelfde volgorde
+FEATURE_DTYPES = {
+    "match_id": object,
+    "game_creation": np.int64,
+    "duration_s": np.int64,
+    "champion": object,
+    "win": np.int64,
+    "kills": np.int64,
+    "deaths": np.int64,
+    "assists": np.int64,
+    "kp": np.float64,
+    "dpm": np.float64,
+    "gpm": np.float64,
+    "team_dmg_pct": np.float64,
+    "vision_score": np.float64,
+    "jungle_cs": np.int64,
+}
+
+# (kolom, bron-key) uit participant["challenges"]
+_CHALLENGE_FIELDS = [
+    ("kp", "killParticipation"),
+    ("dpm", "damagePerMinute"),
+    ("gpm", "goldPerMinute"),
+    ("team_dmg_pct", "teamDamagePercentage"),
+]
+
+
+def _loads(payload):
+    if isinstance(payload, dict):
+        return payload
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def extract_features_batch(payloads, puuid: str) -> pd.DataFrame:
+    """
+    Batch-variant van extract_features: vult voorgealloceerde kolom-arrays direct en
+    bouwt het DataFrame in één stap (geen dict per match).
+    payloads: ruwe JSON bytes/str (bv. MatchStore.get_raw) of al geparste dicts.
+    Matches waarin puuid niet meespeelde worden overgeslagen.
+    """
+    payloads = list(payloads)
+    n = len(payloads)
+    cols = {c: np.empty(n, dtype=t) for c, t in FEATURE_DTYPES.items()}
+    keep = np.zeros(n, dtype=bool)
+    # ontbrekende gameCreation/gameDuration: NaN (zoals None in extract_features), niet 0
+    absent = {"game_creation": np.zeros(n, dtype=bool), "duration_s": np.zeros(n, dtype=bool)}
+
+    for i, payload in enumerate(payloads):
+        m = _loads(payload)
+        meta = m["metadata"]
+        info = m["info"]
+
+        # metadata.participants heeft dezelfde volgorde als info.participants
+        try:
+            idx = meta["participants"].index(puuid)
+            me = info["participants"][idx]
+        except (KeyError, ValueError, IndexError):
+            me = find_participant(m, puuid)
+        if me is None or me.get("puuid") != puuid:
+            continue
+
+        ch = me.get("challenges") or {}
+        keep[i] = True
+
+        cols["match_id"][i] = meta["matchId"]
+        for col, key in (("game_creation", "gameCreation"), ("duration_s", "gameDuration")):
+            value = info.get(key)
+            absent[col][i] = value is None
+            cols[col][i] = 0 if value is None else value
+        cols["champion"][i] = me.get("championName")
+        cols["win"][i] = 1 if me.get("win") else 0
+        cols["kills"][i] = me.get("kills", 0)
+        cols["deaths"][i] = me.get("deaths", 0)
+        cols["assists"][i] = me.get("assists", 0)
+        for col, key in _CHALLENGE_FIELDS:
+            cols[col][i] = ch.get(key, 0.0)
+        cols["vision_score"][i] = me.get("visionScore", 0.0)
+        cols["jungle_cs"][i] = me.get("neutralMinionsKilled", 0)
+
+    df = pd.DataFrame({c: a[keep] for c, a in cols.items()})
+    for col, mask in absent.items():
+        mask = mask[keep]
+        if mask.any():
+            df[col] = df[col].astype(np.float64).mask(mask)
+
+    # afgeleide features, gevectoriseerd (zelfde formules als extract_features)
+    df["kda"] = (df["kills"] + df["assists"]) / np.maximum(df["deaths"], 1)
+    df["deaths_per_10"] = (df["deaths"] / np.maximum(df["duration_s"], 1)) * 600
+
+    return df
+
+
+class FeatureCache:
+    """
+    Begrensde LRU van compacte feature records, key = (match_id, puuid, FEATURE_VERSION).
+    Bewaart ook "speler zat niet in deze match" (None), zodat zo'n match niet opnieuw
+    geparsed wordt.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, match_id: str, puuid: str):
+        key = (match_id, puuid, FEATURE_VERSION)
+        with self._lock:
+            rec = self._items.get(key, self.MISSING)
+            if rec is not self.MISSING:
+                self._items.move_to_end(key)
+            return rec
+
+    def put(self, match_id: str, puuid: str, record: dict | None):
+        with self._lock:
+            self._items[(match_id, puuid, FEATURE_VERSION)] = record
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
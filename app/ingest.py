@@ -0,0 +1,51 @@
+import time
+
+from . import db
+from .client import QUEUE_RANKED, RiotClient
+from .store import get_store
+
+
+def ingest_batches(
+    client: RiotClient,
+    con,
+    match_ids: list[str],
+    tracked: str | set[str],
+    queue_id: int = QUEUE_RANKED,
+    batch_size: int = 200,
+    workers: int = 8,
+    on_batch=None,
+) -> dict:
+    """
+    Gedeelde batch loop van ingest_to_db.py en ingest_worker.py: elke match één keer
+    ophalen (match store + parallel) en rijen schrijven voor de getrackte speler(s).
+    Eén transactie per batch; het ophalen gebeurt erbuiten.
+
+    on_batch(done, remaining): na elke gecommitte batch. remaining = nog niet verwerkte
+    IDs plus tijdelijk gefaalde matches; permanente fouten (4xx) vallen eruit.
+    Returns: stats dict (inserted, failed, permanent, retry, api_s, db_s).
+    """
+    stats = {"inserted": 0, "failed": 0, "permanent": 0, "retry": [], "api_s": 0.0, "db_s": 0.0}
+
+    for i in range(0, len(match_ids), batch_size):
+        chunk = match_ids[i:i + batch_size]
+
+        t0 = time.perf_counter()
+        errors = {}
+        matches, failed = client.get_matches(chunk, store=get_store(), max_workers=workers, errors=errors)
+        t1 = time.perf_counter()
+
+        with con:
+            stats["inserted"] += db.insert_matches(con, [m for m in matches if m is not None], tracked, queue_id)
+        t2 = time.perf_counter()
+
+        permanent = [mid for mid, e in errors.items() if getattr(e, "permanent", False)]
+        stats["retry"] += [mid for mid in chunk if mid in errors and mid not in permanent]
+        stats["failed"] += failed
+        stats["permanent"] += len(permanent)
+        stats["api_s"] += t1 - t0
+        stats["db_s"] += t2 - t1
+
+        if on_batch is not None:
+            on_batch(min(i + batch_size, len(match_ids)), stats["retry"] + match_ids[i + batch_size:])
+
+    return stats
@@ -1,7 +1,19 @@
+import hashlib
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from .features import FEATURE_VERSION
+from .registry import ModelRegistry, fingerprint
 
 FEATURES = [
     "kp",
@@ -37,43 +49,313 @@ def _train(df: pd.DataFrame):
     weights = pd.Series(model.coef_[0], index=FEATURES)
     weights = weights.sort_values(key=lambda s: s.abs(), ascending=False)
 
-    return {"model": model, "auc": auc, "weights": weights}
+    # holdout_ids: games buiten de training (out-of-sample AUC voor subsets, bv. pooled fallback)
+    holdout_ids = frozenset(df.loc[X_test.index, "match_id"])
+    return {"model": model, "auc": auc, "weights": weights, "holdout_ids": holdout_ids}
 
 
-def train_win_model(df: pd.DataFrame, champion: str | None = None):
+class IncrementalWinModel:
     """
-    Train model op df, optioneel gefilterd op champion.
-    champion=None => alle champions
+    Online variant van het win model: logistic regression via SGD (partial_fit) met
+    lopende scaling statistieken. update() verwerkt alleen nog niet geziene matches,
+    dus de kosten schalen met het aantal nieuwe games i.p.v. de hele history.
+
+    AUC is "test-then-train": elke batch wordt eerst voorspeld en pas daarna geleerd;
+    de laatste holdout_n voorspellingen vormen het rolling held-out window.
     """
-    d = df.copy()
 
+    def __init__(self, holdout_n: int = 200, batch_size: int = 50):
+        self.batch_size = batch_size
+        self.scaler = StandardScaler()
+        self.clf = SGDClassifier(loss="log_loss", alpha=1e-3, random_state=42)
+        self.holdout = deque(maxlen=holdout_n)  # (y, proba)
+        self.seen = set()
+        self.n_seen = 0
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.clf.predict_proba(self.scaler.transform(np.asarray(X, dtype=float)))
+
+    def update(self, df: pd.DataFrame) -> int:
+        """
+        Leert de nieuwe games uit df (chronologisch). Returns: aantal verwerkte games.
+        """
+        d = df[~df["match_id"].isin(self.seen)].dropna(subset=["win"])
+        if "game_creation" in d.columns:
+            d = d.sort_values("game_creation")
+
+        X_all = d[FEATURES].fillna(0).to_numpy(dtype=float)
+        y_all = d["win"].astype(int).to_numpy()
+
+        # eerste fit: hooguit 75% leren vóór er gescoord wordt, zodat ook kleine
+        # scopes (<= batch_size games) een held-out staart hebben
+        bounds = list(range(0, len(d), self.batch_size))
+        if not self.n_seen and len(d) > 1:
+            first = min(self.batch_size, max(1, int(len(d) * 0.75)))
+            bounds = [0, *range(first, len(d), self.batch_size)]
+
+        for i, end in zip(bounds, bounds[1:] + [len(d)]):
+            X = X_all[i:end]
+            y = y_all[i:end]
+
+            if self.n_seen:
+                self.holdout.extend(zip(y, self.predict_proba(X)[:, 1]))
+
+            self.scaler.partial_fit(X)
+            self.clf.partial_fit(self.scaler.transform(X), y, classes=[0, 1])
+            self.n_seen += len(y)
+
+        self.seen.update(d["match_id"])
+        return len(d)
+
+    def auc(self) -> float | None:
+        if not self.holdout:
+            return None
+        y, p = zip(*self.holdout)
+        if len(set(y)) < 2:
+            return None
+        return roc_auc_score(y, p)
+
+    def result(self):
+        """
+        Zelfde vorm als _train ({"model", "auc", "weights"}); None bij te weinig data.
+        weights zijn in gestandaardiseerde eenheden (per std van de feature).
+        """
+        auc = self.auc()
+        if self.n_seen < 20 or auc is None:
+            return None
+
+        weights = pd.Series(self.clf.coef_[0], index=FEATURES)
+        weights = weights.sort_values(key=lambda s: s.abs(), ascending=False)
+        return {"model": self, "auc": auc, "weights": weights}
+
+
+def _incremental_key(scope: str, champion: str) -> str:
+    # vaste key per speler/champion (geen fingerprint: het model groeit mee met de data)
+    raw = f"sgd|{scope}|{champion}|{FEATURE_VERSION}|{','.join(FEATURES)}"
+    return "inc-" + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def update_win_model(
+    df: pd.DataFrame,
+    champion: str | None = None,
+    registry: ModelRegistry | None = None,
+    scope: str = "",
+):
+    """
+    Incrementele modus: laadt het online model voor (scope, champion) uit de registry,
+    leert alleen de nieuwe games en slaat het weer op.
+    scope onderscheidt spelers (bv. de puuid).
+    Zonder geldige held-out AUC (te weinig games, één klasse) => het volledige model.
+    """
+    d = df
     if champion and champion != "All":
         d = d[d["champion"] == champion]
 
-    d = d.dropna(subset=["win"])
+    if registry is None:
+        model = IncrementalWinModel()
+        model.update(d)
+    else:
+        key = _incremental_key(scope, champion or "All")
+        model = registry.get(key) or IncrementalWinModel()
+        if model.update(d):
+            registry.put(key, model)
+
+    result = model.result()
+    if result is None:
+        return train_win_model(df, champion=champion, registry=registry, scope=scope)
+    return result
+
+
+def _model_key(d: pd.DataFrame, scope: str, champion: str) -> str:
+    # scope (speler) in de fingerprint: duo partners hebben dezelfde match IDs maar andere features
+    return fingerprint(d["match_id"], FEATURES, f"{scope}|{champion}")
+
 
-    return _train(d)
+def _champion_frame(df: pd.DataFrame, champion: str | None) -> pd.DataFrame:
+    # geen kopie: filter/dropna geven al een nieuw frame en er wordt niets gemuteerd
+    d = df
 
-def predict_win_proba(df: pd.DataFrame, champion: str | None = None):
+    if champion and champion != "All":
+        d = d[d["champion"] == champion]
+
+    return d.dropna(subset=["win"])
+
+
+def train_win_model(
+    df: pd.DataFrame,
+    champion: str | None = None,
+    registry: ModelRegistry | None = None,
+    mode: str = "full",
+    scope: str = "",
+):
+    """
+    Train model op df, optioneel gefilterd op champion.
+    champion=None => alle champions
+    Met een registry wordt een eerder gefit model voor exact dezelfde matches (en scope,
+    bv. de puuid) hergebruikt.
+    mode="incremental" => online model dat alleen nieuwe games leert (zie update_win_model).
+    """
+    if mode == "incremental":
+        return update_win_model(df, champion=champion, registry=registry, scope=scope)
+
+    d = _champion_frame(df, champion)
+
+    if registry is None:
+        return _train(d)
+
+    key = _model_key(d, scope, champion or "All")
+    return registry.get_or_train(key, lambda: _train(d))
+
+def predict_win_proba(
+    df: pd.DataFrame,
+    champion: str | None = None,
+    registry: ModelRegistry | None = None,
+    mode: str = "full",
+    scope: str = "",
+):
     """
     Train model (optioneel champion-filter) en voorspelt win probability per game.
     Returns: (result_dict, df_with_pred)
     """
-    result = train_win_model(df, champion=champion)
+    result = train_win_model(df, champion=champion, registry=registry, mode=mode, scope=scope)
     if result is None:
         return None, None
 
     model = result["model"]
 
-    d = df.copy()
-    if champion and champion != "All":
-        d = d[d["champion"] == champion].copy()
-
     # Safety
-    d = d.dropna(subset=["win"]).copy()
+    d = _champion_frame(df, champion)
     if len(d) == 0:
         return None, None
 
+    # assign: één kopie (het resultaat krijgt een extra kolom), df zelf blijft ongewijzigd
     X = d[FEATURES].fillna(0)
-    d["pred_win_proba"] = model.predict_proba(X)[:, 1]
-    return result, d
+    return result, d.assign(pred_win_proba=model.predict_proba(X)[:, 1])
+
+
+# Eén champion model kost ± 10-50 ms, een spawn pool opstarten ± 1.5 s: de pool alleen
+# bij veel champions of een heel groot frame, en hergebruikt over aanroepen heen
+POOL_MIN_CHAMPIONS = 64
+POOL_MIN_ROWS = 200_000
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _process_pool(max_workers: int | None) -> ProcessPoolExecutor:
+    """
+    Proces-brede pool voor train_all_champion_models; opnieuw aangemaakt als max_workers wijzigt.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn i.p.v. fork: veilig vanuit een proces met threads (Streamlit, API)
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx)
+            _pool_workers = max_workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _top_weights(weights: pd.Series, n: int = 3) -> str:
+    return ", ".join(f"{name} {w:+.2f}" for name, w in weights.head(n).items())
+
+
+def train_all_champion_models(
+    df: pd.DataFrame,
+    registry: ModelRegistry | None = None,
+    max_workers: int | None = None,
+    fallback: str | None = "pooled",
+    min_games: int = 20,
+    scope: str = "",
+) -> pd.DataFrame:
+    """
+    Traint het model voor elke champion met genoeg data (>= min_games, wins én losses);
+    vanaf POOL_MIN_CHAMPIONS champions of POOL_MIN_ROWS games parallel in een gedeelde
+    process pool. Modellen die al in de registry staan worden niet opnieuw getraind.
+
+    fallback="pooled": champions zonder eigen model krijgen het "All" model; AUC is dan
+    die van het pooled model op hun games uit de holdout van dat model (None als daar
+    geen wins én losses in zitten). scope onderscheidt spelers in de registry (bv. de puuid).
+
+    Returns: tabel per champion (games, winrate, auc, source, top_weights), beste AUC eerst.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    frames = {c: _champion_frame(df, c) for c in df["champion"].dropna().unique()}
+    eligible = [c for c, d in frames.items() if len(d) >= min_games and d["win"].nunique() == 2]
+
+    results = {}
+    keys = {}
+    todo = []
+    for c in eligible:
+        if registry is not None:
+            keys[c] = _model_key(frames[c], scope, c)
+            missing = object()
+            cached = registry.get(keys[c], missing)
+            if cached is not missing:
+                results[c] = cached
+                continue
+        todo.append(c)
+
+    rows_todo = sum(len(frames[c]) for c in todo)
+    if len(todo) > 1 and (len(todo) >= POOL_MIN_CHAMPIONS or rows_todo >= POOL_MIN_ROWS):
+        try:
+            pool = _process_pool(max_workers)
+            for c, result in zip(todo, pool.map(_train, [frames[c] for c in todo])):
+                results[c] = result
+        except BrokenProcessPool:
+            # worker gecrasht: volgende aanroep start een nieuwe pool, nu serieel afmaken
+            _reset_pool()
+
+    for c in todo:
+        if c not in results:
+            results[c] = _train(frames[c])
+
+    if registry is not None:
+        for c in todo:
+            registry.put(keys[c], results[c])
+
+    pooled = None
+    if fallback == "pooled":
+        pooled = train_win_model(df, champion="All", registry=registry, scope=scope)
+
+    rows = []
+    for c, d in frames.items():
+        result = results.get(c)
+        source = "champion"
+        auc = None
+        if result is not None:
+            auc = result["auc"]
+        elif pooled is not None:
+            result = pooled
+            source = "pooled"
+            # alleen games waar het pooled model niet op getraind is
+            held_out = d[d["match_id"].isin(pooled.get("holdout_ids", ()))]
+            if held_out["win"].nunique() == 2:
+                proba = pooled["model"].predict_proba(held_out[FEATURES].fillna(0))[:, 1]
+                auc = roc_auc_score(held_out["win"].astype(int), proba)
+
+        rows.append({
+            "champion": c,
+            "games": len(d),
+            "winrate": d["win"].mean(),
+            "auc": auc,
+            "source": source if result is not None else None,
+            "top_weights": _top_weights(result["weights"]) if result is not None else None,
+        })
+
+    return (
+        pd.DataFrame(rows)
+        .sort_values(["source", "auc", "games"], ascending=[True, False, False], na_position="last")
+        .reset_index(drop=True)
+    )
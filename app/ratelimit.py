@@ -0,0 +1,124 @@
+import threading
+import time
+
+# Riot development key defaults: 20 requests / 1s en 100 requests / 120s
+DEFAULT_LIMITS = [(20, 1), (100, 120)]
+
+
+def parse_rate_header(value: str | None) -> list[tuple[int, int]]:
+    """
+    Parse een Riot rate-limit header ("20:1,100:120") naar [(count, seconds), ...].
+    """
+    if not value:
+        return []
+
+    out = []
+    for part in value.split(","):
+        try:
+            count, seconds = part.strip().split(":")
+            out.append((int(count), int(seconds)))
+        except ValueError:
+            continue
+    return out
+
+
+class _Bucket:
+    """
+    Token bucket voor één Riot window. Riot telt per vast window (vanaf de eerste
+    request), dus de bucket vult in één keer bij aan het einde van het window
+    i.p.v. geleidelijk.
+    """
+
+    def __init__(self, limit: int, seconds: int):
+        self.limit = limit
+        self.seconds = seconds
+        self.tokens = limit
+        self.window_start = None
+
+    def _refill(self, now: float):
+        if self.window_start is not None and now - self.window_start >= self.seconds:
+            self.tokens = self.limit
+            self.window_start = None
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens > 0:
+            return 0.0
+        return self.window_start + self.seconds - now
+
+    def take(self, now: float):
+        if self.window_start is None:
+            self.window_start = now
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter voor alle Riot windows tegelijk (per-seconde en per-2-minuten).
+
+    - acquire() blokkeert tot er in elk window een token vrij is
+    - update(headers) synchroniseert limieten en verbruik met X-App-Rate-Limit(-Count)
+    - penalize(seconds) pauzeert alle threads na een 429 (Retry-After)
+
+    share < 1.0 beperkt dit proces tot dat deel van het key budget (bv. een achtergrond
+    sync naast het dashboard).
+    """
+
+    def __init__(self, limits=None, margin: int = 1, share: float = 1.0):
+        self._lock = threading.Lock()
+        self._margin = margin
+        self._share = share
+        self._buckets = [self._bucket(c, s) for c, s in (limits or DEFAULT_LIMITS)]
+        self._blocked_until = 0.0
+
+    def _limit(self, count: int) -> int:
+        # kleine marge zodat requests van andere processen met dezelfde key niet direct 429 geven
+        return max(int(count * self._share) - self._margin, 1)
+
+    def _bucket(self, count: int, seconds: int) -> _Bucket:
+        return _Bucket(self._limit(count), seconds)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(self._blocked_until - now, 0.0)
+                for b in self._buckets:
+                    wait = max(wait, b.wait_time(now))
+
+                if wait <= 0:
+                    for b in self._buckets:
+                        b.take(now)
+                    return
+
+            time.sleep(wait)
+
+    def update(self, headers):
+        limits = parse_rate_header(headers.get("X-App-Rate-Limit"))
+        counts = dict((s, c) for c, s in parse_rate_header(headers.get("X-App-Rate-Limit-Count")))
+        if not limits:
+            return
+
+        with self._lock:
+            current = {b.seconds: b for b in self._buckets}
+            buckets = []
+            for count, seconds in limits:
+                b = current.get(seconds)
+                if b is None:
+                    b = self._bucket(count, seconds)
+                else:
+                    b.limit = self._limit(count)
+                    b.tokens = min(b.tokens, b.limit)
+
+                # server telt ook requests van andere processen: nooit boven het totale budget
+                if seconds in counts:
+                    b.tokens = min(b.tokens, count - self._margin - counts[seconds])
+                    if b.window_start is None:
+                        b.window_start = time.monotonic()
+                buckets.append(b)
+
+            self._buckets = buckets
+
+    def penalize(self, seconds: float):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import joblib
+
+from .features import FEATURE_VERSION
+
+# Gefitte modellen (joblib), gedeeld door dashboard-reruns en processen. Standaard in de
+# project root (zoals de match store), onafhankelijk van de working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.getenv("LOL_MODELS_DIR", os.path.join(PROJECT_ROOT, "models"))
+
+# Oudere fingerprints (matchset is sindsdien gegroeid) worden opgeruimd
+MAX_FILES = 200
+
+
+def fingerprint(match_ids, features: list[str], scope: str, kind: str = "logreg") -> str:
+    """
+    Hash van de trainingsdata: match IDs (volgorde-onafhankelijk) + feature lijst +
+    scope (speler en/of champion filter) + modeltype + FEATURE_VERSION.
+    """
+    h = hashlib.sha256()
+    h.update(f"{kind}|{scope}|{FEATURE_VERSION}|{','.join(features)}\n".encode())
+    for mid in sorted(match_ids):
+        h.update(mid.encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Gefitte modellen + AUC/weights op disk, key = fingerprint van de trainingsdata.
+
+    Zolang er geen nieuwe matches bijkomen blijft de fingerprint gelijk en wordt er niet
+    opnieuw getraind. "Te weinig data" (None) wordt ook bewaard. Een kleine LRU in het
+    geheugen voorkomt dat elke rerun het bestand opnieuw laadt.
+    """
+
+    def __init__(self, path: str = MODELS_DIR, max_memory: int = 64, max_files: int = MAX_FILES):
+        self.path = path
+        self.max_memory = max_memory
+        self.max_files = max_files
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.joblib")
+
+    def _remember(self, key: str, result):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        try:
+            result = joblib.load(self._file(key))["result"]
+        except (FileNotFoundError, EOFError, KeyError):
+            return default
+        self._remember(key, result)
+        return result
+
+    def put(self, key: str, result):
+        # atomair via rename: een half geschreven bestand is nooit zichtbaar voor andere processen
+        tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump({"result": result}, tmp)
+        os.replace(tmp, self._file(key))
+        self._remember(key, result)
+        self._prune()
+
+    def get_or_train(self, key: str, train):
+        missing = object()
+        result = self.get(key, missing)
+        if result is missing:
+            result = train()
+            self.put(key, result)
+        return result
+
+    def _prune(self):
+        files = [
+            os.path.join(self.path, f)
+            for f in os.listdir(self.path)
+            if f.endswith(".joblib")
+        ]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for f in files[:len(files) - self.max_files]:
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """
+    Proces-brede ModelRegistry op MODELS_DIR.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
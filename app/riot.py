@@ -1,96 +1,93 @@
 import streamlit as st
-import random
-import time
-import requests
 from .config import ROUTING, TIMEOUT, riot_api_key, QUEUE_RANKED
+from .client import RiotClient
+from .features import FeatureCache, extract_features_batch
+from .store import get_store
 
+# Max aantal feature records in het Streamlit proces (± 1 KB per record)
+FEATURE_CACHE_SIZE = 20000
 
-def riot_get(url: str, params=None, max_retries=7):
+
+@st.cache_resource
+def client() -> RiotClient:
     """
-    GET request met:
-    - 429 rate-limit handling
-    - 5xx (502/503/504) transient error retry met exponential backoff
+    Eén gedeelde client (pooled sessions + rate limiter) voor alle reruns en sessies.
     """
-    headers = {"X-Riot-Token": riot_api_key()}
-    backoff = 0.8  # start in seconds
-
-    for attempt in range(max_retries):
-        try:
-            r = requests.get(url, headers=headers, params=params, timeout=TIMEOUT)
-        except requests.RequestException:
-            # network glitch: retry
-            time.sleep(backoff + random.random() * 0.2)
-            backoff = min(backoff * 1.8, 8)
-            continue
-
-        # Rate limit
-        if r.status_code == 429:
-            retry_after = int(r.headers.get("Retry-After", "1"))
-            time.sleep(retry_after)
-            continue
-
-        # Transient server/proxy errors
-        if r.status_code in (502, 503, 504):
-            time.sleep(backoff + random.random() * 0.2)
-            backoff = min(backoff * 1.8, 8)
-            continue
-
-        return r
-
-    return r
-
+    return RiotClient(riot_api_key(), routing=ROUTING, timeout=TIMEOUT)
 
 
 @st.cache_data(ttl=900)
 def get_puuid(game_name: str, tag_line: str) -> str:
-    url = f"https://{ROUTING}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
-    r = riot_get(url)
-
-    if r.status_code != 200:
-        raise RuntimeError(f"get_puuid failed: {r.status_code} {r.text}")
-
-    return r.json()["puuid"]
+    return client().get_puuid(game_name, tag_line)
 
 @st.cache_data(ttl=900)
-def get_ranked_match_ids(puuid: str, want: int = 60) -> list[str]:
+def get_ranked_match_ids(puuid: str, want: int = 60, start_time: int | None = None) -> list[str]:
     """
     Haalt ranked solo/duo match IDs op met pagination.
+    start_time (Unix seconds) beperkt tot games vanaf dat moment.
     """
-    url = f"https://{ROUTING}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
-
-    ids = []
-    start = 0
-
-    while len(ids) < want:
-        batch_size = min(100, want - len(ids))
+    return client().get_match_ids(puuid, total=want, queue=QUEUE_RANKED, start_time=start_time)
 
-        r = riot_get(
-            url,
-            params={
-                "start": start,
-                "count": batch_size,
-                "queue": QUEUE_RANKED,
-            },
-        )
 
-        if r.status_code != 200:
-            raise RuntimeError(f"get_match_ids failed: {r.status_code} {r.text}")
+def get_match(match_id: str) -> dict:
+    """
+    Match uit de persistente match store; alleen bij een miss wordt er gedownload.
+    """
+    return client().get_match(match_id, store=get_store())
 
-        batch = r.json()
-        if not batch:
-            break
 
-        ids.extend(batch)
-        start += batch_size
+def get_matches(
+    match_ids: list[str], max_workers: int = 8, errors: dict | None = None
+) -> tuple[list[dict | None], int]:
+    """
+    Haalt matches parallel op (thread pool achter de gedeelde rate limiter).
+    errors: optioneel dict dat gevuld wordt met match_id -> exception.
+    Returns: (matches in dezelfde volgorde als match_ids, None bij falen; aantal gefaalde matches)
+    """
+    return client().get_matches(match_ids, store=get_store(), max_workers=max_workers, errors=errors)
 
-    return ids
 
-@st.cache_data(ttl=900)
-def get_match(match_id: str) -> dict:
-    url = f"https://{ROUTING}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    r = riot_get(url)
+@st.cache_resource
+def feature_cache() -> FeatureCache:
+    """
+    Proces-brede feature cache. cache_resource geeft hetzelfde object terug (geen pickle/copy
+    per hit zoals cache_data); records worden nooit gemuteerd.
+    """
+    return FeatureCache(FEATURE_CACHE_SIZE)
 
-    if r.status_code != 200:
-        raise RuntimeError(f"get_match failed: {r.status_code} {r.text}")
 
-    return r.json()
+def get_match_features(match_ids: list[str], puuid: str) -> tuple[list[dict], int]:
+    """
+    Feature records voor puuid (volgorde van match_ids). Alleen cache misses worden
+    geëxtraheerd: uit de match store als ruwe bytes (orjson parse in de batch extractor),
+    alleen wat daar ontbreekt komt van de API.
+    Returns: (records, aantal gefaalde matches)
+    """
+    cache = feature_cache()
+    todo = [mid for mid in match_ids if cache.get(mid, puuid) is FeatureCache.MISSING]
+
+    failed = 0
+    if todo:
+        store = get_store()
+        raw = {mid: store.get_raw(mid) for mid in todo}
+        payloads = [r for r in raw.values() if r is not None]
+        done = {mid for mid, r in raw.items() if r is not None}
+
+        missing = [mid for mid in todo if mid not in done]
+        if missing:
+            matches, failed = get_matches(missing)
+            fetched = [m for m in matches if m is not None]
+            payloads += fetched
+            done.update(m["metadata"]["matchId"] for m in fetched)
+
+        found = {r["match_id"]: r for r in extract_features_batch(payloads, puuid).to_dict("records")}
+        for mid in todo:
+            if mid in done:
+                cache.put(mid, puuid, found.get(mid))
+
+    records = []
+    for mid in match_ids:
+        rec = cache.get(mid, puuid)
+        if rec is not FeatureCache.MISSING and rec is not None:
+            records.append(rec)
+    return records, failed
@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+# Raw match v5 payloads, gedeeld door dashboard, ingest en scripts. Standaard in de
+# project root naast lol.db, onafhankelijk van de working directory (of via LOL_MATCH_STORE)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_PATH = os.getenv("LOL_MATCH_STORE", os.path.join(PROJECT_ROOT, "match_store.db"))
+
+
+class MatchStore:
+    """
+    Persistente, gecomprimeerde opslag van ruwe match JSON, key = match ID.
+
+    Afgelopen matches veranderen nooit, dus er is geen TTL. SQLite (WAL mode +
+    busy timeout) maakt gelijktijdig lezen/schrijven vanuit meerdere processen veilig;
+    elke thread krijgt een eigen connectie.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+        con = self._con()
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS raw_matches (
+              match_id TEXT PRIMARY KEY,
+              data BLOB NOT NULL
+            )
+        """)
+        con.commit()
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def get_raw(self, match_id: str) -> bytes | None:
+        """
+        Gedecomprimeerde JSON bytes, of None als de match niet opgeslagen is.
+        """
+        row = self._con().execute(
+            "SELECT data FROM raw_matches WHERE match_id = ?", (match_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0])
+
+    def get(self, match_id: str) -> dict | None:
+        raw = self.get_raw(match_id)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def put(self, match_id: str, match_json: dict):
+        data = zlib.compress(json.dumps(match_json, separators=(",", ":")).encode(), 6)
+        con = self._con()
+        # INSERT OR IGNORE: als een ander proces hem net ook schreef is de inhoud identiek
+        con.execute(
+            "INSERT OR IGNORE INTO raw_matches(match_id, data) VALUES (?, ?)",
+            (match_id, data),
+        )
+        con.commit()
+
+    def get_or_fetch(self, match_id: str, fetch) -> dict:
+        """
+        Leest de match uit de store; download via fetch(match_id) en sla op als hij ontbreekt.
+        """
+        match_json = self.get(match_id)
+        if match_json is None:
+            match_json = fetch(match_id)
+            self.put(match_id, match_json)
+        return match_json
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> MatchStore:
+    """
+    Proces-brede MatchStore op STORE_PATH.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MatchStore()
+        return _store
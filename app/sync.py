@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+
+from . import db
+from .tilt import update_tilt_state
+from .client import QUEUE_RANKED, RiotClient
+from .store import get_store
+
+# Adaptief poll-interval per speler (seconden)
+MIN_INTERVAL = 180     # net een game gespeeld: de volgende komt vaak binnen ~30 min
+MAX_INTERVAL = 3600    # idle spelers: hooguit één keer per uur
+
+# Paginagrootte van de ID-lijst per poll; er wordt doorgepagineerd tot een pagina korter is
+PER_POLL = 20
+
+# Bovengrens per poll (daemon lang uit); oudere games vallen onder ingest --backfill
+MAX_IDS_PER_POLL = 1000
+
+# Wachttijd na een mislukte ronde (bv. database is locked); verdubbelt tot max_interval
+ERROR_BACKOFF = 5
+
+log = logging.getLogger(__name__)
+
+
+class SyncDaemon:
+    """
+    Houdt lol.db warm: pollt elke getrackte speler op nieuwe ranked match IDs en schrijft
+    nieuwe matches weg. Spelers met nieuwe games worden vaker gepolld (MIN_INTERVAL),
+    idle spelers steeds minder vaak (interval verdubbelt tot MAX_INTERVAL).
+    De staat per speler staat in de sync_state tabel.
+    """
+
+    def __init__(
+        self,
+        client: RiotClient,
+        db_path: str = db.DB_PATH,
+        min_interval: int = MIN_INTERVAL,
+        max_interval: int = MAX_INTERVAL,
+        per_poll: int = PER_POLL,
+    ):
+        self.client = client
+        self.db_path = db_path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.per_poll = per_poll
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _poll(self, con, player: dict, tracked: set[str], state: dict | None) -> dict:
+        puuid = player["puuid"]
+        now = int(time.time())
+        interval = (state or {}).get("interval_s") or self.min_interval
+        state = dict(state or {"puuid": puuid, "last_new_game": None, "games_added": 0})
+
+        try:
+            latest = db.latest_game_creation(con, puuid)
+            ids = self.client.get_match_ids(
+                puuid,
+                # nieuwe speler: alleen de recente games; anders alles sinds latest
+                total=MAX_IDS_PER_POLL if latest else self.per_poll,
+                queue=QUEUE_RANKED,
+                start_time=latest // 1000 if latest else None,
+                page_size=self.per_poll,
+            )
+            # eerder gefaalde matches vallen buiten start_time: expliciet opnieuw proberen
+            retry = db.retry_match_ids(con, puuid)
+            need = db.missing_player_matches(con, puuid, list(dict.fromkeys(ids + retry)))
+
+            errors = {}
+            matches = []
+            if need:
+                matches, _ = self.client.get_matches(need, store=get_store(), errors=errors)
+            with con:
+                before = db.count_player_games(con, puuid)
+                db.insert_matches(con, [m for m in matches if m is not None], tracked)
+                games = db.count_player_games(con, puuid)
+                db.record_failed_matches(con, puuid, errors)
+                db.clear_failed_matches(con, puuid, [mid for mid in retry if mid not in errors])
+
+            # ook zonder nieuwe matches: games van deze speler kunnen via een andere poll binnengekomen zijn
+            with con:
+                update_tilt_state(con, puuid)
+
+            # rijen van deze speler sinds de vorige poll, ook als de poll van een andere
+            # speler de gedeelde match al had opgeslagen
+            prev = state.get("games")
+            added = games - (prev if prev is not None else before)
+            state["games"] = games
+
+            if added:
+                interval = self.min_interval
+                state["last_new_game"] = now
+                state["games_added"] += added
+            else:
+                interval = min(interval * 2, self.max_interval)
+            state["last_error"] = None
+        except Exception as e:
+            interval = min(interval * 2, self.max_interval)
+            state["last_error"] = str(e)[:500]
+
+        state.update(last_sync=now, interval_s=interval, next_poll=now + interval)
+        with con:
+            db.save_sync_state(con, state)
+        return state
+
+    def run_once(self) -> float:
+        """
+        Pollt alle spelers die aan de beurt zijn (langst wachtende eerst).
+        Returns: seconden tot de volgende speler aan de beurt is.
+        """
+        con = db.connect(self.db_path)
+        try:
+            with con:
+                db.init_schema(con)
+
+            roster = db.list_players(con)
+            states = db.sync_states(con)
+            tracked = {p["puuid"] for p in roster}
+            now = time.time()
+
+            due = [p for p in roster if (states.get(p["puuid"]) or {}).get("next_poll", 0) <= now]
+            due.sort(key=lambda p: (states.get(p["puuid"]) or {}).get("next_poll", 0))
+
+            for p in due:
+                if self._stop.is_set():
+                    break
+                states[p["puuid"]] = self._poll(con, p, tracked, states.get(p["puuid"]))
+        finally:
+            con.close()
+
+        if not roster:
+            return self.max_interval
+        next_poll = min((states.get(p["puuid"]) or {}).get("next_poll", 0) for p in roster)
+        return max(next_poll - time.time(), 1.0)
+
+    def run(self):
+        # een fout in één ronde (schema, roster, sync_state schrijven) mag de thread niet stoppen
+        backoff = ERROR_BACKOFF
+        while not self._stop.is_set():
+            try:
+                wait = self.run_once()
+                backoff = ERROR_BACKOFF
+            except Exception:
+                log.exception("sync round failed; retrying in %ss", backoff)
+                wait = backoff
+                backoff = min(backoff * 2, self.max_interval)
+            self._stop.wait(wait)
+
+    def start(self) -> threading.Thread:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="lol-sync", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float | None = 10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
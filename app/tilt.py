@@ -1,5 +1,17 @@
+import math
+from collections import deque
+
+import numpy as np
 import pandas as pd
 
+from . import db
+
+# Drempels (gedeeld door detect_tilt, TiltTracker en tilt_history)
+WINRATE_DROP = 0.20
+Z_DROP = 0.8
+PRED_DROP = 0.10
+LEVELS = [(5, "HIGH"), (3, "MEDIUM"), (1, "LOW")]
+
 
 def _zscore(value, mean, std):
     if std is None or std == 0 or pd.isna(std):
@@ -15,7 +27,8 @@ def detect_tilt(df: pd.DataFrame, recent_n: int = 7, baseline_n: int = 60):
     if df is None or df.empty or len(df) < max(15, recent_n + 5):
         return None
 
-    d = df.sort_values("game_datetime").copy()
+    # build_dataframe levert al gesorteerd aan; alleen lezen, dus geen kopie nodig
+    d = df if df["game_datetime"].is_monotonic_increasing else df.sort_values("game_datetime")
 
     # neem baseline uit het verleden (excl. de meest recente games)
     recent = d.tail(recent_n)
@@ -35,54 +48,70 @@ def detect_tilt(df: pd.DataFrame, recent_n: int = 7, baseline_n: int = 60):
     rec_d10 = recent["deaths_per_10"].mean()
     base_d10 = baseline["deaths_per_10"].mean()
 
+    # Optional: predicted win probability
+    pred = None
+    if "pred_win_proba" in d.columns and d["pred_win_proba"].notna().any():
+        pred = (recent["pred_win_proba"].mean(), baseline["pred_win_proba"].mean(), baseline["pred_win_proba"].std())
+
+    return _assess(
+        recent_n=recent_n,
+        baseline_n=min(baseline_n, len(baseline)),
+        win=(rec_win, base_win),
+        kda=(rec_kda, base_kda, baseline["kda"].std()),
+        d10=(rec_d10, base_d10, baseline["deaths_per_10"].std()),
+        pred=pred,
+    )
+
+
+def _assess(recent_n: int, baseline_n: int, win, kda, d10, pred=None) -> dict:
+    """
+    Score/flags/level uit recent vs baseline statistieken.
+    win=(recent, baseline); kda, d10, pred=(recent mean, baseline mean, baseline std).
+    """
+    rec_win, base_win = win
+    rec_kda, base_kda, std_kda = kda
+    rec_d10, base_d10, std_d10 = d10
+
     # z-scores (performance drop)
-    z_kda = _zscore(rec_kda, baseline["kda"].mean(), baseline["kda"].std())
-    z_d10 = _zscore(rec_d10, baseline["deaths_per_10"].mean(), baseline["deaths_per_10"].std())
+    z_kda = _zscore(rec_kda, base_kda, std_kda)
+    z_d10 = _zscore(rec_d10, base_d10, std_d10)
 
     flags = []
     score = 0
 
     # Winrate drop
-    if (base_win - rec_win) >= 0.20 and recent_n >= 5:
+    if (base_win - rec_win) >= WINRATE_DROP and recent_n >= 5:
         flags.append("Winrate drop (recent << baseline)")
         score += 2
 
     # KDA drop (negatief z)
-    if z_kda <= -0.8:
+    if z_kda <= -Z_DROP:
         flags.append("KDA significantly down vs baseline")
         score += 2
 
     # Deaths/10 up (positief z)
-    if z_d10 >= 0.8:
+    if z_d10 >= Z_DROP:
         flags.append("Deaths/10 significantly up vs baseline")
         score += 2
 
     # Optional: predicted win probability drop
-    if "pred_win_proba" in d.columns and d["pred_win_proba"].notna().any():
-        rec_p = recent["pred_win_proba"].mean()
-        base_p = baseline["pred_win_proba"].mean()
-        z_p = _zscore(rec_p, baseline["pred_win_proba"].mean(), baseline["pred_win_proba"].std())
-        if z_p <= -0.8 or (base_p - rec_p) >= 0.10:
+    if pred is not None:
+        rec_p, base_p, std_p = pred
+        z_p = _zscore(rec_p, base_p, std_p)
+        if z_p <= -Z_DROP or (base_p - rec_p) >= PRED_DROP:
             flags.append("Predicted win probability dropped")
             score += 1
     else:
         rec_p = base_p = None
 
     # Interpretatie
-    if score >= 5:
-        level = "HIGH"
-    elif score >= 3:
-        level = "MEDIUM"
-    elif score >= 1:
-        level = "LOW"
-    else:
-        level = "NONE"
+    level = next((name for cutoff, name in LEVELS if score >= cutoff), "NONE")
 
     return {
         "level": level,
         "score": score,
         "recent_n": recent_n,
-        "baseline_n": min(baseline_n, len(baseline)),
+        "baseline_n": baseline_n,
         "recent_winrate": rec_win,
         "baseline_winrate": base_win,
         "recent_kda": rec_kda,
@@ -92,4 +121,352 @@ def detect_tilt(df: pd.DataFrame, recent_n: int = 7, baseline_n: int = 60):
         "recent_pred": rec_p,
         "baseline_pred": base_p,
         "flags": flags,
-    }
\ No newline at end of file
+    }
+
+
+# Volgorde van de waarden per game in TiltTracker
+TRACKED = ("win", "kda", "deaths_per_10", "pred_win_proba")
+
+
+class _Window:
+    """
+    Sliding window met lopende som en kwadratensom per metric (NaN telt niet mee,
+    zoals bij pandas mean/std). Sommen worden periodiek uit de deque herberekend
+    zodat afrondingsfouten niet oplopen.
+    """
+
+    def __init__(self, size: int, games=()):
+        self.games = deque(maxlen=size)
+        self.games.extend(games)
+        self._rebuild()
+
+    def _rebuild(self):
+        self.n = [0] * len(TRACKED)
+        self.s = [0.0] * len(TRACKED)
+        self.ss = [0.0] * len(TRACKED)
+        for g in self.games:
+            self._add(g, 1)
+        self._updates = 0
+
+    def _add(self, game, sign: int):
+        for i, v in enumerate(game):
+            if v is None or v != v:
+                continue
+            self.n[i] += sign
+            self.s[i] += sign * v
+            self.ss[i] += sign * v * v
+
+    def push(self, game):
+        """Voegt een game toe; returns de game die uit het window valt (of None)."""
+        evicted = None
+        if len(self.games) == self.games.maxlen:
+            evicted = self.games[0]
+            self._add(evicted, -1)
+        self.games.append(game)
+        self._add(game, 1)
+
+        self._updates += 1
+        if self._updates >= max(self.games.maxlen, 50):
+            self._rebuild()
+        return evicted
+
+    def mean(self, i: int) -> float:
+        return self.s[i] / self.n[i] if self.n[i] else float("nan")
+
+    def std(self, i: int) -> float:
+        n = self.n[i]
+        if n < 2:
+            return float("nan")
+        var = (self.ss[i] - self.s[i] * self.s[i] / n) / (n - 1)
+        # constante waarden: afrondingsruis i.p.v. exact 0 (pandas geeft 0)
+        if var <= 1e-12 * (1.0 + (self.s[i] / n) ** 2):
+            return 0.0
+        return math.sqrt(var)
+
+
+class TiltTracker:
+    """
+    Incrementele variant van detect_tilt voor één speler: push() per nieuwe game is O(1)
+    (recent window + baseline window met lopende sommen), result() geeft hetzelfde dict
+    als detect_tilt. Games moeten chronologisch binnenkomen.
+
+    to_dict()/from_dict() maken de staat JSON-serialiseerbaar (tilt_state tabel).
+    """
+
+    def __init__(self, recent_n: int = 7, baseline_n: int = 60):
+        self.recent_n = recent_n
+        self.baseline_n = baseline_n
+        self.n = 0
+        self.last_ts = None
+        self.has_pred = False
+        self.first = []                          # eerste 10 games (baseline als de history kort is)
+        self.recent = _Window(recent_n)
+        self.baseline = _Window(baseline_n)      # games die uit recent gevallen zijn
+
+    def push(self, game: dict) -> bool:
+        """
+        game: dict met game_creation, win, kda, deaths_per_10, (optioneel) pred_win_proba.
+        Returns False als de game niet nieuwer is dan de laatst verwerkte.
+        """
+        ts = game.get("game_creation")
+        if ts is not None and self.last_ts is not None and ts <= self.last_ts:
+            return False
+
+        values = tuple(_num(game.get(c)) for c in TRACKED)
+        if values[3] is not None:
+            self.has_pred = True
+        if len(self.first) < 10:
+            self.first.append(values)
+
+        evicted = self.recent.push(values)
+        if evicted is not None:
+            self.baseline.push(evicted)
+
+        self.n += 1
+        self.last_ts = ts if ts is not None else self.last_ts
+        return True
+
+    def result(self) -> dict | None:
+        if self.n < max(15, self.recent_n + 5):
+            return None
+
+        if self.n - self.recent_n < 10:
+            # zelfde randgeval als detect_tilt: baseline = eerste 10 games
+            base = _Window(min(self.baseline_n, 10), self.first)
+        else:
+            base = self.baseline
+        rec = self.recent
+
+        win, kda, d10, pred = range(len(TRACKED))
+        return _assess(
+            recent_n=self.recent_n,
+            baseline_n=len(base.games),
+            win=(rec.mean(win), base.mean(win)),
+            kda=(rec.mean(kda), base.mean(kda), base.std(kda)),
+            d10=(rec.mean(d10), base.mean(d10), base.std(d10)),
+            pred=(rec.mean(pred), base.mean(pred), base.std(pred)) if self.has_pred else None,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "recent_n": self.recent_n,
+            "baseline_n": self.baseline_n,
+            "n": self.n,
+            "last_ts": self.last_ts,
+            "has_pred": self.has_pred,
+            "first": [list(g) for g in self.first],
+            "recent": [list(g) for g in self.recent.games],
+            "baseline": [list(g) for g in self.baseline.games],
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "TiltTracker":
+        t = cls(state["recent_n"], state["baseline_n"])
+        t.n = state["n"]
+        t.last_ts = state["last_ts"]
+        t.has_pred = state["has_pred"]
+        t.first = [tuple(g) for g in state["first"]]
+        t.recent = _Window(t.recent_n, (tuple(g) for g in state["recent"]))
+        t.baseline = _Window(t.baseline_n, (tuple(g) for g in state["baseline"]))
+        return t
+
+
+def _num(v):
+    # None/NaN => None (JSON-vriendelijk, telt niet mee in de window statistieken)
+    if v is None or pd.isna(v):
+        return None
+    return float(v)
+
+
+def update_tilt_state(con, puuid: str, queue_id: int = db.QUEUE_RANKED) -> dict | None:
+    """
+    Werkt de opgeslagen TiltTracker van puuid bij met de games in lol.db die nieuwer zijn
+    dan de laatst verwerkte game. Commit is aan de caller.
+    Returns: het tilt result (zelfde vorm als detect_tilt) of None bij te weinig games.
+    """
+    state = db.load_tilt_state(con, puuid)
+    tracker = TiltTracker.from_dict(state) if state else TiltTracker()
+
+    rows = db.feature_rows_since(con, puuid, tracker.last_ts, queue_id)
+
+    # een oudere game is later toegevoegd (backfill): opnieuw opbouwen
+    if state and tracker.n + len(rows) < db.count_player_games(con, puuid, queue_id):
+        tracker = TiltTracker(tracker.recent_n, tracker.baseline_n)
+        rows = db.feature_rows_since(con, puuid, None, queue_id)
+
+    if not rows and state:
+        return tracker.result()
+
+    for r in rows:
+        tracker.push(r)
+
+    result = tracker.result()
+    db.save_tilt_state(con, puuid, tracker.to_dict(), result)
+    return result
+
+
+def _vec_zscore(value: np.ndarray, mean: np.ndarray, std: np.ndarray) -> np.ndarray:
+    ok = ~np.isnan(std) & (std != 0)
+    return np.where(ok, (value - mean) / np.where(ok, std, 1.0), 0.0)
+
+
+def _vec_assess(rec_mean: pd.DataFrame, base_mean: pd.DataFrame, base_std: pd.DataFrame, has_pred, recent_n: int) -> pd.DataFrame:
+    """
+    _assess voor veel rijen tegelijk (kolommen: win, kda, deaths_per_10, optioneel pred_win_proba).
+    """
+    n = len(rec_mean)
+
+    def col(frame, name):
+        return frame[name].to_numpy(dtype=float)
+
+    z_kda = _vec_zscore(col(rec_mean, "kda"), col(base_mean, "kda"), col(base_std, "kda"))
+    z_d10 = _vec_zscore(col(rec_mean, "deaths_per_10"), col(base_mean, "deaths_per_10"), col(base_std, "deaths_per_10"))
+
+    f_win = ((col(base_mean, "win") - col(rec_mean, "win")) >= WINRATE_DROP) & (recent_n >= 5)
+    f_kda = z_kda <= -Z_DROP
+    f_d10 = z_d10 >= Z_DROP
+
+    if "pred_win_proba" in rec_mean.columns:
+        rec_p = col(rec_mean, "pred_win_proba")
+        base_p = col(base_mean, "pred_win_proba")
+        z_p = _vec_zscore(rec_p, base_p, col(base_std, "pred_win_proba"))
+        f_pred = has_pred & ((z_p <= -Z_DROP) | ((base_p - rec_p) >= PRED_DROP))
+        rec_p = np.where(has_pred, rec_p, np.nan)
+        base_p = np.where(has_pred, base_p, np.nan)
+    else:
+        f_pred = np.zeros(n, dtype=bool)
+        rec_p = base_p = np.full(n, np.nan)
+
+    score = 2 * f_win.astype(int) + 2 * f_kda + 2 * f_d10 + f_pred
+    level = np.select([score >= cutoff for cutoff, _ in LEVELS], [name for _, name in LEVELS], "NONE")
+
+    names = [
+        (f_win, "Winrate drop (recent << baseline)"),
+        (f_kda, "KDA significantly down vs baseline"),
+        (f_d10, "Deaths/10 significantly up vs baseline"),
+        (f_pred, "Predicted win probability dropped"),
+    ]
+    flags = [[name for mask, name in names if mask[i]] for i in range(n)]
+
+    return pd.DataFrame({
+        "level": level,
+        "score": score,
+        "recent_winrate": col(rec_mean, "win"),
+        "baseline_winrate": col(base_mean, "win"),
+        "recent_kda": col(rec_mean, "kda"),
+        "baseline_kda": col(base_mean, "kda"),
+        "recent_deaths10": col(rec_mean, "deaths_per_10"),
+        "baseline_deaths10": col(base_mean, "deaths_per_10"),
+        "recent_pred": rec_p,
+        "baseline_pred": base_p,
+        "z_kda": z_kda,
+        "z_deaths10": z_d10,
+        "flags": flags,
+    }, index=rec_mean.index)
+
+
+def tilt_history(df: pd.DataFrame, recent_n: int = 7, baseline_n: int = 60) -> pd.DataFrame | None:
+    """
+    detect_tilt voor elke game-prefix in één gevectoriseerde pass (rolling windows).
+    De laatste rij is gelijk aan detect_tilt(df). Games vóór er genoeg history is
+    (max(15, recent_n + 5)) worden overgeslagen.
+    Returns: DataFrame per game (game_datetime, level, score, flags, recent/baseline stats).
+    """
+    min_games = max(15, recent_n + 5)
+    if df is None or df.empty or len(df) < min_games:
+        return None
+
+    d = df if df["game_datetime"].is_monotonic_increasing else df.sort_values("game_datetime")
+    n = len(d)
+    has_pred_col = "pred_win_proba" in d.columns
+    metrics = ["win", "kda", "deaths_per_10"] + (["pred_win_proba"] if has_pred_col else [])
+    vals = d[metrics].astype(float).reset_index(drop=True)
+
+    # recent = laatste recent_n games van de prefix
+    rec_mean = vals.rolling(recent_n, min_periods=1).mean()
+
+    # baseline = laatste baseline_n games vóór het recent window ...
+    roll = vals.rolling(baseline_n, min_periods=1)
+    base_mean = roll.mean().shift(recent_n)
+    base_std = roll.std().shift(recent_n)
+    base_len = pd.Series(np.minimum(np.arange(n) + 1 - recent_n, baseline_n))
+
+    # ... of, als daar nog geen 10 games zijn, de eerste 10 games (zoals detect_tilt)
+    head = vals.head(10).tail(min(baseline_n, 10))
+    short = (np.arange(n) + 1 - recent_n) < 10
+    base_mean[short] = head.mean().to_numpy()
+    base_std[short] = head.std().to_numpy()
+    base_len[short] = len(head)
+
+    has_pred = vals["pred_win_proba"].notna().cummax().to_numpy() if has_pred_col else np.zeros(n, dtype=bool)
+
+    out = _vec_assess(rec_mean, base_mean, base_std, has_pred, recent_n)
+    out.index = d.index
+    out.insert(0, "game_datetime", d["game_datetime"].to_numpy())
+    out.insert(3, "baseline_n", base_len.to_numpy())
+    if "match_id" in d.columns:
+        out.insert(0, "match_id", d["match_id"].to_numpy())
+
+    return out.iloc[min_games - 1:]
+
+
+def roster_tilt(df: pd.DataFrame, recent_n: int = 7, baseline_n: int = 60) -> pd.DataFrame:
+    """
+    detect_tilt voor veel spelers tegelijk, in één gegroepeerde pass.
+
+    df: long format met puuid, game_creation (of game_datetime), win, kda, deaths_per_10,
+    optioneel pred_win_proba en games (totaal per speler, als df per speler is afgekapt
+    zoals bij db.load_roster_tilt_frame).
+    Returns: tabel per speler met tilt level/score/stats, hoogste tilt eerst.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    order = "game_creation" if "game_creation" in df.columns else "game_datetime"
+    d = df.sort_values(["puuid", order], kind="stable")
+    g = d.groupby("puuid", sort=False)
+
+    total = d["games"] if "games" in d.columns else g["puuid"].transform("size")
+    from_start = g.cumcount()
+    from_end = g.cumcount(ascending=False)
+
+    recent = from_end < recent_n
+    short = (total - recent_n) < 10
+    # lange history: baseline_n games vóór het recent window; korte: head(10).tail(baseline_n)
+    baseline = np.where(
+        short,
+        (from_start < 10) & (from_start >= 10 - min(baseline_n, 10)),
+        (from_end >= recent_n) & (from_end < recent_n + baseline_n),
+    )
+
+    metrics = ["win", "kda", "deaths_per_10"] + (["pred_win_proba"] if "pred_win_proba" in d.columns else [])
+    vals = d[["puuid", *metrics]].astype({m: float for m in metrics})
+
+    rec_mean = vals[recent].groupby("puuid").mean()
+    base = vals[baseline].groupby("puuid")
+    base_mean = base.mean().reindex(rec_mean.index)
+    base_std = base.std().reindex(rec_mean.index)
+
+    games = total.groupby(d["puuid"]).first().reindex(rec_mean.index)
+    eligible = (games >= max(15, recent_n + 5)).to_numpy()
+    rec_mean, base_mean, base_std = rec_mean[eligible], base_mean[eligible], base_std[eligible]
+    if rec_mean.empty:
+        return pd.DataFrame()
+
+    if "pred_win_proba" in metrics:
+        has_pred = vals["pred_win_proba"].notna().groupby(vals["puuid"]).any().reindex(rec_mean.index).to_numpy()
+    else:
+        has_pred = np.zeros(len(rec_mean), dtype=bool)
+
+    out = _vec_assess(rec_mean, base_mean, base_std, has_pred, recent_n)
+    out.insert(0, "games", games[eligible].to_numpy())
+    out.insert(1, "baseline_n", base[metrics[0]].size().reindex(rec_mean.index).to_numpy())
+
+    names = [c for c in ("game_name", "tag_line") if c in d.columns]
+    if names:
+        out = out.join(g[names].first())
+
+    return (
+        out.sort_values(["score", "z_kda", "recent_winrate"], ascending=[False, True, True])
+        .reset_index()
+    )
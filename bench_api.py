@@ -0,0 +1,137 @@
+"""
+Load test voor lol_api.
+
+  python bench_api.py db                     # connect-per-request vs ReadOnlyPool (geen server nodig)
+  python bench_api.py http --url http://127.0.0.1:8000 --puuid <puuid>
+
+De db-mode bouwt een synthetische database (players × games) zodat de cijfers
+niet van de lokale lol.db afhangen.
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import db
+
+CHAMPIONS = ["Amumu", "Diana", "Malzahar", "Trundle", "Vi", "Zed", "Ahri", "Lee Sin", "Kayn", "Nidalee"]
+
+SUMMARY_SQL = """
+    SELECT win, kills, deaths, assists
+    FROM participant_stats
+    WHERE puuid = ? AND queue_id = ?
+    ORDER BY game_creation DESC
+    LIMIT ?
+"""
+
+
+def build_db(path: str, players: int, games: int):
+    con = sqlite3.connect(path)
+    db.init_schema(con)
+    rnd = random.Random(42)
+
+    for p in range(players):
+        puuid = f"bench-{p}"
+        con.execute("INSERT OR REPLACE INTO players VALUES (?, ?, ?)", (puuid, f"Bench {p}", "EUW"))
+        matches = []
+        stats = []
+        for g in range(games):
+            mid = f"EUW1_{p}_{g}"
+            created = 1_700_000_000_000 + g * 1_800_000
+            matches.append((mid, 420, created, 1800))
+            stats.append((
+                mid, puuid, 420, created, rnd.choice(CHAMPIONS), rnd.randint(0, 1),
+                rnd.randint(0, 15), rnd.randint(0, 12), rnd.randint(0, 20),
+            ))
+        con.executemany("INSERT OR IGNORE INTO matches VALUES (?, ?, ?, ?)", matches)
+        con.executemany(
+            """INSERT OR IGNORE INTO participant_stats(
+                   match_id, puuid, queue_id, game_creation, champion_name, win, kills, deaths, assists
+               ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            stats,
+        )
+    con.commit()
+    con.close()
+
+
+def percentiles(samples: list[float]) -> str:
+    s = sorted(samples)
+    p50 = s[len(s) // 2] * 1000
+    p99 = s[int(len(s) * 0.99) - 1] * 1000
+    return f"p50 {p50:.3f} ms | p99 {p99:.3f} ms | mean {statistics.mean(s) * 1000:.3f} ms"
+
+
+def run(fn, requests_total: int, concurrency: int) -> tuple[list[float], float]:
+    def timed(i):
+        t0 = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        samples = list(ex.map(timed, range(requests_total)))
+    return samples, time.perf_counter() - t0
+
+
+def bench_db(args):
+    path = args.db
+    build_db(path, args.players, args.games)
+    puuids = [f"bench-{p}" for p in range(args.players)]
+
+    def per_request(i):
+        con = sqlite3.connect(path)
+        con.row_factory = sqlite3.Row
+        con.execute(SUMMARY_SQL, (puuids[i % len(puuids)], 420, 20)).fetchall()
+        con.close()
+
+    pool = db.ReadOnlyPool(path, size=args.concurrency)
+
+    def pooled(i):
+        with pool.connection() as con:
+            con.execute(SUMMARY_SQL, (puuids[i % len(puuids)], 420, 20)).fetchall()
+
+    for name, fn in (("connect per request", per_request), ("ReadOnlyPool", pooled)):
+        run(fn, 200, args.concurrency)  # warm-up
+        samples, wall = run(fn, args.requests, args.concurrency)
+        print(f"{name:<20} {percentiles(samples)} | {args.requests / wall:.0f} req/s")
+
+    pool.close()
+
+
+def bench_http(args):
+    import requests
+
+    session = requests.Session()
+    url = f"{args.url.rstrip('/')}/stats/summary"
+
+    def call(i):
+        r = session.get(url, params={"puuid": args.puuid, "limit": 20})
+        r.raise_for_status()
+
+    run(call, 100, args.concurrency)  # warm-up
+    samples, wall = run(call, args.requests, args.concurrency)
+    print(f"GET /stats/summary   {percentiles(samples)} | {args.requests / wall:.0f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="lol_api load test")
+    parser.add_argument("mode", choices=["db", "http"])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--db", default="bench_lol.db", help="synthetische database (db mode)")
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--puuid", default="bench-0")
+    args = parser.parse_args()
+
+    if args.mode == "db":
+        bench_db(args)
+    else:
+        bench_http(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: extract_features per match (json + dict per record) vs extract_features_batch.
+
+  python bench_features.py --matches 5000
+
+Genereert synthetische match v5 payloads met 10 deelnemers en ~240 velden per deelnemer,
+vergelijkbaar met de echte API responses.
+"""
+import argparse
+import json
+import random
+import time
+
+import pandas as pd
+
+from app.analytics import build_dataframe
+from app.features import extract_features, extract_features_batch, orjson
+
+PUUID = "bench-me"
+
+
+def fake_match(i: int, rnd: random.Random) -> dict:
+    participants = []
+    for slot in range(10):
+        p = {f"stat{k}": rnd.randint(0, 5000) for k in range(120)}
+        p.update({
+            "puuid": PUUID if slot == i % 10 else f"other-{i}-{slot}",
+            "championName": rnd.choice(["Vi", "Amumu", "Trundle", "Diana", "Kayn"]),
+            "win": slot < 5,
+            "kills": rnd.randint(0, 15),
+            "deaths": rnd.randint(0, 12),
+            "assists": rnd.randint(0, 20),
+            "visionScore": rnd.randint(5, 60),
+            "neutralMinionsKilled": rnd.randint(0, 220),
+            "challenges": {
+                **{f"challenge{k}": rnd.random() * 100 for k in range(120)},
+                "killParticipation": rnd.random(),
+                "damagePerMinute": rnd.random() * 1200,
+                "goldPerMinute": 250 + rnd.random() * 300,
+                "teamDamagePercentage": rnd.random() * 0.4,
+            },
+        })
+        participants.append(p)
+
+    return {
+        "metadata": {"matchId": f"EUW1_{i}", "participants": [p["puuid"] for p in participants]},
+        "info": {
+            "gameCreation": 1_700_000_000_000 + i * 1_800_000,
+            "gameDuration": rnd.randint(1200, 2400),
+            "queueId": 420,
+            "participants": participants,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=5000)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    raw = [json.dumps(fake_match(i, rnd)).encode() for i in range(args.matches)]
+    print(f"{args.matches} matches, {sum(map(len, raw)) / 1e6:.0f} MB raw JSON, orjson: {orjson is not None}")
+
+    t0 = time.perf_counter()
+    records = [extract_features(json.loads(b), PUUID) for b in raw]
+    df_old = build_dataframe([r for r in records if r])
+    t_old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df_new = build_dataframe(extract_features_batch(raw, PUUID))
+    t_new = time.perf_counter() - t0
+
+    pd.testing.assert_frame_equal(df_old.reset_index(drop=True), df_new.reset_index(drop=True))
+
+    print(f"per-match dicts : {t_old:.2f}s ({args.matches / t_old:.0f} matches/s)")
+    print(f"batch columnar  : {t_new:.2f}s ({args.matches / t_new:.0f} matches/s)")
+    print(f"speedup         : {t_old / t_new:.1f}x")
+
+    # alleen de extractie (payloads al geparst), los van JSON parsing
+    parsed = [json.loads(b) for b in raw]
+    t0 = time.perf_counter()
+    build_dataframe([r for r in (extract_features(m, PUUID) for m in parsed) if r])
+    t_old = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    build_dataframe(extract_features_batch(parsed, PUUID))
+    t_new = time.perf_counter() - t0
+    print(f"extract only    : {t_old * 1000:.0f} ms -> {t_new * 1000:.0f} ms ({t_old / t_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
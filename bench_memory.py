@@ -0,0 +1,101 @@
+"""
+Benchmark: geheugen van build_dataframe (standaard vs compact=True) op een multi-player frame.
+
+  python bench_memory.py --players 100 --games 500
+
+Meet de grootte van het frame (memory_usage deep) en de piek (tracemalloc) van het
+dashboard-pad: win probability toevoegen, tilt en tilt history. In standaardmodus met
+het oude patroon (df.copy() + merge), in compact modus met de kolom-toewijzing.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import pandas as pd
+
+from app.analytics import build_dataframe
+from app.ml import predict_win_proba
+from app.tilt import detect_tilt, tilt_history
+
+CHAMPIONS = ["Vi", "Amumu", "Trundle", "Diana", "Kayn", "Lee Sin", "Nidalee", "Viego", "Sejuani", "Zac"]
+
+
+def fake_records(players: int, games: int, rnd: random.Random) -> list[dict]:
+    records = []
+    for p in range(players):
+        puuid = f"{p:04d}" + "x" * 74  # Riot puuids zijn 78 tekens
+        for g in range(games):
+            deaths = rnd.randint(0, 12)
+            records.append({
+                "match_id": f"EUW1_{7_000_000_000 + p * games + g}",
+                "puuid": puuid,
+                "game_creation": 1_700_000_000_000 + g * 3_600_000 + p,
+                "duration_s": rnd.randint(1200, 2400),
+                "champion": rnd.choice(CHAMPIONS),
+                "win": rnd.randint(0, 1),
+                "kills": rnd.randint(0, 15),
+                "deaths": deaths,
+                "assists": rnd.randint(0, 20),
+                "kp": rnd.random(),
+                "dpm": rnd.random() * 1200,
+                "gpm": 250 + rnd.random() * 300,
+                "team_dmg_pct": rnd.random() * 0.4,
+                "vision_score": rnd.randint(5, 60),
+                "jungle_cs": rnd.randint(0, 220),
+                "kda": rnd.random() * 8,
+                "deaths_per_10": deaths / 3,
+            })
+    return records
+
+
+def pipeline(df_all: pd.DataFrame, compact: bool):
+    _, df_pred = predict_win_proba(df_all, champion="All")
+
+    if compact:
+        # in-place kolom op df_all, zoals het dashboard
+        df_with_pred = df_all
+        pred = pd.Series(df_pred["pred_win_proba"].to_numpy(), index=df_pred["match_id"])
+        df_all["pred_win_proba"] = df_all["match_id"].map(pred).astype("float32")
+    else:
+        # oude dashboard patroon
+        df_with_pred = df_all.copy().merge(df_pred[["match_id", "pred_win_proba"]], on="match_id", how="left")
+
+    detect_tilt(df_with_pred)
+    tilt_history(df_with_pred)
+
+
+def measure(records: list[dict], compact: bool) -> dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    df_all = build_dataframe(records, compact=compact)
+    frame_mb = df_all.memory_usage(deep=True).sum() / 1e6
+    pipeline(df_all, compact)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"frame_mb": frame_mb, "peak_mb": peak / 1e6, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--games", type=int, default=500)
+    args = parser.parse_args()
+
+    records = fake_records(args.players, args.games, random.Random(42))
+    print(f"{len(records)} games, {args.players} players")
+
+    base = measure(records, compact=False)
+    small = measure(records, compact=True)
+
+    for name, r in (("standard", base), ("compact", small)):
+        print(f"{name:9}: frame {r['frame_mb']:6.1f} MB | pipeline peak {r['peak_mb']:6.1f} MB | {r['seconds']:.2f}s")
+    print(
+        f"reduction: frame {base['frame_mb'] / small['frame_mb']:.1f}x, "
+        f"peak {base['peak_mb'] / small['peak_mb']:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
 import streamlit as st
 import pandas as pd
 
+from app import db
 from app.config import players
-from app.riot import get_puuid, get_ranked_match_ids, get_match
-from app.features import extract_features
+from app.riot import get_puuid, get_ranked_match_ids, get_matches, get_match_features
 from app.analytics import build_dataframe, champion_table
-from app.ml import train_win_model, predict_win_proba
+from app.ml import train_win_model, predict_win_proba, train_all_champion_models
+from app.registry import get_registry
 from app.clustering import cluster_playstyles
-from app.tilt import detect_tilt
+from app.tilt import detect_tilt, tilt_history
 
 
 # -----------------------------
@@ -20,6 +21,12 @@ with st.sidebar:
     st.header("Settings")
     selected_player = st.selectbox("Player", players())
     last_n = st.selectbox("Show last N games", [10, 20, 30, 50], index=1)
+    data_source = st.radio(
+        "Data source",
+        ["Riot API", "lol.db"],
+        index=0,
+        help="lol.db: lees opgeslagen matches en haal alleen nieuwere games op via de API.",
+    )
 
     refresh = st.button("Refresh (clear cache)")
     if refresh:
@@ -34,27 +41,56 @@ with st.sidebar:
 # -----------------------------
 try:
     game_name, tag = selected_player.split("#", 1)
-    puuid = get_puuid(game_name, tag)
 
     # We halen meer IDs op voor ML/Clustering/Tilt (maar tonen last_n in UI)
     want_ids = max(last_n + 25, 120)
-    match_ids = get_ranked_match_ids(puuid, want=want_ids)
 
-    records = []
-    failed = 0
+    if data_source == "lol.db":
+        con = db.connect()
+        with con:
+            db.init_schema(con)
+        puuid = db.find_puuid(con, game_name, tag) or get_puuid(game_name, tag)
+
+        # Alleen games na de nieuwste opgeslagen game via de API ophalen en wegschrijven
+        latest = db.latest_game_creation(con, puuid)
+        since = latest // 1000 if latest else None
+        # eerder gefaalde matches liggen vóór `since` en komen niet meer in de listing
+        retry = db.retry_match_ids(con, puuid)
+        new_ids = db.missing_player_matches(
+            con, puuid, list(dict.fromkeys(get_ranked_match_ids(puuid, want=want_ids, start_time=since) + retry))
+        )
 
-    for mid in match_ids:
-        try:
-            match_json = get_match(mid)
-        except Exception:
-            failed += 1
-            continue
+        # rijen van een oudere extractor: payloads uit de match store (of parallel van de API),
+        # allemaal vóór de transactie zodat de write lock kort blijft; mislukte matches overslaan
+        stale = db.stale_feature_rows(con, puuid)
+        fetched = []
+        failed = 0
+        errors = {}
+        if new_ids or stale:
+            fetched, failed = get_matches(list(dict.fromkeys(new_ids + [mid for mid, _ in stale])), errors=errors)
+        payloads = {m["metadata"]["matchId"]: m for m in fetched if m is not None}
+
+        with con:
+            if new_ids:
+                db.upsert_player(con, puuid, game_name, tag)
+                # rijen voor elke getrackte speler in deze matches, niet alleen de geselecteerde
+                tracked = {p["puuid"] for p in db.list_players(con)}
+                db.insert_matches(con, [payloads[mid] for mid in new_ids if mid in payloads], tracked)
+                db.record_failed_matches(con, puuid, {mid: e for mid, e in errors.items() if mid in new_ids})
+            db.clear_failed_matches(con, puuid, [mid for mid in retry if mid not in errors])
+            db.recompute_features(con, stale, payloads)
+
+        records = db.load_feature_records(con, puuid, limit=want_ids)
+        con.close()
+    else:
+        puuid = get_puuid(game_name, tag)
+        match_ids = get_ranked_match_ids(puuid, want=want_ids)
 
-        rec = extract_features(match_json, puuid)
-        if rec:
-            records.append(rec)
+        # compacte feature records uit de proces-cache; alleen misses raken de match store / API
+        records, failed = get_match_features(match_ids, puuid)
 
-    df_all = build_dataframe(records)
+    # compact: categorical champion, kleine dtypes, game_datetime als index (charts zonder set_index)
+    df_all = build_dataframe(records, compact=True)
 
     if failed > 0:
         st.warning(f"Riot API transient errors. Skipped {failed} matches while fetching.")
@@ -101,10 +137,10 @@ with tab_overview:
     c8.metric("Deaths/10", f"{df['deaths_per_10'].mean():.2f}")
 
     st.subheader("Winrate Trend (Rolling 10)")
-    st.line_chart(df.set_index("game_datetime")["winrate_roll10"])
+    st.line_chart(df["winrate_roll10"])
 
     st.subheader("Damage & Gold Per Minute")
-    st.line_chart(df.set_index("game_datetime")[["dpm", "gpm"]])
+    st.line_chart(df[["dpm", "gpm"]])
 
     st.subheader("Champion Pool (shown)")
     st.dataframe(champion_table(df).head(12), use_container_width=True)
@@ -127,8 +163,14 @@ with tab_ml:
 
     champ_list = ["All"] + sorted(df_all["champion"].dropna().unique().tolist())
     selected_champ = st.selectbox("Train / view model for champion", champ_list, index=0)
+    ml_mode = st.radio(
+        "Training",
+        ["full", "incremental"],
+        horizontal=True,
+        help="incremental: online model dat alleen nieuwe games leert; AUC over een rolling held-out window.",
+    )
 
-    ml_result = train_win_model(df_all, champion=selected_champ)
+    ml_result = train_win_model(df_all, champion=selected_champ, registry=get_registry(), mode=ml_mode, scope=puuid)
 
     if ml_result is None:
         st.info("Te weinig games of te weinig win/loss variatie voor dit (champion) model.")
@@ -148,8 +190,18 @@ with tab_ml:
         if "vision_score" in weights.index and weights["vision_score"] > 0:
             st.write("👁 Vision correleert positief met wins.")
 
+    st.subheader("All champion models")
+    champ_models = train_all_champion_models(df_all, registry=get_registry(), scope=puuid)
+    if champ_models.empty:
+        st.info("Geen champion modellen (te weinig games).")
+    else:
+        st.dataframe(champ_models, use_container_width=True)
+        st.caption("source=pooled: te weinig eigen games; AUC van het All model op de games van die champion buiten zijn training (leeg als dat er te weinig zijn).")
+
     st.subheader("Predicted win probability per game")
-    _, df_pred = predict_win_proba(df_all, champion=selected_champ)
+    _, df_pred = predict_win_proba(
+        df_all, champion=selected_champ, registry=get_registry(), mode=ml_mode, scope=puuid
+    )
 
     if df_pred is None:
         st.info("Kan geen win probability plot maken (te weinig data/variatie).")
@@ -160,7 +212,7 @@ with tab_ml:
             .sort_values("game_datetime")
         )
 
-        st.line_chart(dfp.set_index("game_datetime")["pred_win_proba"])
+        st.line_chart(dfp["pred_win_proba"])
 
         view_cols = ["game_datetime", "champion", "win", "pred_win_proba", "kp", "dpm", "gpm", "deaths_per_10"]
         st.dataframe(
@@ -176,23 +228,15 @@ with tab_ml:
 
 
 # -----------------------------
-# Prepare df_all_with_pred for Tilt (using All-champ model)
+# Add pred_win_proba to df_all for Tilt (using All-champ model)
 # We do this OUTSIDE tabs so Tilt can always use it.
 # -----------------------------
-df_all_with_pred = df_all.copy()
-_, df_pred_all = predict_win_proba(df_all_with_pred, champion="All")
+# Bewust in-place op df_all (geen kopie/merge van het hele frame): vanaf hier heeft
+# df_all een extra kolom pred_win_proba (via match_id, NaN zonder voorspelling).
+_, df_pred_all = predict_win_proba(df_all, champion="All", registry=get_registry(), scope=puuid)
 if df_pred_all is not None and "pred_win_proba" in df_pred_all.columns:
-    df_all_with_pred = df_all_with_pred.merge(
-        df_pred_all[["match_id", "pred_win_proba"]],
-        on="match_id",
-        how="left",
-        suffixes=("", "_new"),
-    )
-    if "pred_win_proba_new" in df_all_with_pred.columns:
-        df_all_with_pred["pred_win_proba"] = df_all_with_pred["pred_win_proba_new"].combine_first(
-            df_all_with_pred.get("pred_win_proba")
-        )
-        df_all_with_pred = df_all_with_pred.drop(columns=["pred_win_proba_new"])
+    pred_by_match = pd.Series(df_pred_all["pred_win_proba"].to_numpy(), index=df_pred_all["match_id"])
+    df_all["pred_win_proba"] = df_all["match_id"].map(pred_by_match).astype("float32")
 
 
 # -----------------------------
@@ -202,8 +246,14 @@ with tab_playstyles:
     st.subheader("Playstyles (KMeans clustering)")
 
     k = st.selectbox("Number of playstyles (K)", [3, 4, 5], index=1)
+    refit_styles = st.button(
+        "Refit playstyles",
+        help="Nieuwe games worden anders alleen aan bestaande clusters toegewezen; refit gebeurt automatisch bij drift.",
+    )
 
-    df_clustered, cluster_summary = cluster_playstyles(df_all, k=k)
+    df_clustered, cluster_summary = cluster_playstyles(
+        df_all, k=k, registry=get_registry(), scope=puuid, refit=refit_styles
+    )
 
     if df_clustered is None:
         st.info("Te weinig games voor clustering (richtlijn: minimaal ~20-25).")
@@ -257,7 +307,7 @@ with tab_tilt:
     recent_n = st.selectbox("Recent window (games)", [5, 7, 10], index=1)
     baseline_n = st.selectbox("Baseline window (games)", [30, 60, 80], index=1)
 
-    tilt = detect_tilt(df_all_with_pred, recent_n=recent_n, baseline_n=baseline_n)
+    tilt = detect_tilt(df_all, recent_n=recent_n, baseline_n=baseline_n)
 
     if tilt is None:
         st.info("Te weinig data voor tilt analyse.")
@@ -294,4 +344,19 @@ with tab_tilt:
             for f in tilt["flags"]:
                 st.write(f"- {f}")
 
-st.caption("Data cached (15 min). Refresh in sidebar clears cache.")
\ No newline at end of file
+        history = tilt_history(df_all, recent_n=recent_n, baseline_n=baseline_n)
+        if history is not None:
+            st.subheader("Tilt score timeline")
+            st.line_chart(history["score"])
+
+            episodes = history[history["level"].isin(["MEDIUM", "HIGH"])]
+            if not episodes.empty:
+                st.caption(f"{len(episodes)} games met tilt risk MEDIUM/HIGH in de history")
+                view = episodes.sort_values("game_datetime", ascending=False).head(25).copy()
+                view["flags"] = view["flags"].str.join(", ")
+                st.dataframe(
+                    view[["game_datetime", "level", "score", "recent_winrate", "recent_kda", "flags"]],
+                    use_container_width=True,
+                )
+
+st.caption("Matches worden permanent opgeslagen (match store). Refresh in sidebar ververst match-lijsten.")
\ No newline at end of file
@@ -1,9 +1,15 @@
 import os
+import json
 import time
-import sqlite3
-import requests
+import argparse
 from dotenv import load_dotenv
 
+from app import db
+from app.client import RiotClient
+from app.ingest import ingest_batches
+from app.store import get_store
+from app.tilt import update_tilt_state
+
 load_dotenv()
 API_KEY = (os.getenv("RIOT_API_KEY") or "").strip()
 ROUTING = "europe"
@@ -11,126 +17,150 @@ ROUTING = "europe"
 GAME_NAME = "Evil Wim"  # pas aan indien nodig
 TAG_LINE  = "jotul"
 
-headers = {"X-Riot-Token": API_KEY}
-
 TARGET_QUEUE = 420  # ranked solo/duo
 
-def riot_get(url: str, params=None, timeout=20, max_retries=5):
-    for _ in range(max_retries):
-        r = requests.get(url, headers=headers, params=params, timeout=timeout)
-        if r.status_code == 429:
-            time.sleep(int(r.headers.get("Retry-After", "1")))
-            continue
-        return r
-    return r
+# Backfill: Riot geeft max 100 IDs per pagina; dit is de bovengrens voor "volledige history"
+BACKFILL_MAX_IDS = 20000
 
-def get_puuid():
-    url = f"https://{ROUTING}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{GAME_NAME}/{TAG_LINE}"
-    r = riot_get(url)
-    if r.status_code != 200:
-        raise RuntimeError(f"get_puuid failed: {r.status_code} {r.text}")
-    return r.json()["puuid"]
+CHECKPOINT_PATH = "ingest_checkpoint.json"
 
-def get_match_ids_ranked(puuid: str, total: int = 200):
-    """Haalt ranked match IDs op met pagination (count max 100)."""
-    url = f"https://{ROUTING}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
-
-    ids = []
-    start = 0
-    while len(ids) < total:
-        batch_count = min(100, total - len(ids))
-        r = riot_get(url, params={"start": start, "count": batch_count, "queue": TARGET_QUEUE})
-        if r.status_code != 200:
-            raise RuntimeError(f"get_match_ids failed: {r.status_code} {r.text}")
-
-        batch = r.json()
-        if not batch:
-            break
-
-        ids.extend(batch)
-        start += batch_count
-
-    return ids
-
-def get_match(match_id: str):
-    url = f"https://{ROUTING}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    r = riot_get(url)
-    if r.status_code != 200:
-        raise RuntimeError(f"get_match failed for {match_id}: {r.status_code} {r.text}")
-    return r.json()
-
-def find_me(match_json: dict, puuid: str):
-    for p in match_json["info"]["participants"]:
-        if p["puuid"] == puuid:
-            return p
-    return None
-
-def match_exists(con, match_id: str) -> bool:
-    cur = con.cursor()
-    cur.execute("SELECT 1 FROM matches WHERE match_id = ? LIMIT 1", (match_id,))
-    return cur.fetchone() is not None
+# Aantal recente match IDs zonder --backfill/--total
+DEFAULT_TOTAL = 200
 
-def main():
-    puuid = get_puuid()
-    print("PUUID:", puuid)
+client = RiotClient(API_KEY, routing=ROUTING)
 
-    con = sqlite3.connect("lol.db")
-    cur = con.cursor()
+def get_puuid():
+    return client.get_puuid(GAME_NAME, TAG_LINE)
 
-    # player upsert
-    cur.execute(
-        "INSERT OR REPLACE INTO players(puuid, game_name, tag_line) VALUES (?, ?, ?)",
-        (puuid, GAME_NAME, TAG_LINE),
+def get_match_ids_ranked(puuid: str, total: int = 200):
+    """Haalt ranked match IDs op met pagination (count max 100)."""
+    return client.get_match_ids(puuid, total=total, queue=TARGET_QUEUE)
+
+def load_checkpoint(puuid: str) -> list[str] | None:
+    """Match IDs van een onderbroken run voor deze speler (of None)."""
+    if not os.path.exists(CHECKPOINT_PATH):
+        return None
+    with open(CHECKPOINT_PATH) as f:
+        cp = json.load(f)
+    if cp.get("puuid") != puuid:
+        return None
+    return cp["match_ids"]
+
+def save_checkpoint(puuid: str, match_ids: list[str]):
+    tmp = CHECKPOINT_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"puuid": puuid, "match_ids": match_ids}, f)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+def clear_checkpoint():
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+
+def ingest(con, puuid: str, match_ids: list[str], batch_size: int = 200, workers: int = 8) -> dict:
+    """
+    Parallel ophalen + gebatchte writes (app.ingest). Na elke gecommitte batch bevat de
+    checkpoint alleen nog de resterende IDs plus tijdelijk gefaalde matches.
+    Returns: stats dict (inserted, failed, permanent, retry, api_s, db_s).
+    """
+    def on_batch(done: int, remaining: list[str]):
+        save_checkpoint(puuid, remaining)
+        print(f"  {done}/{len(match_ids)} processed")
+
+    return ingest_batches(
+        client, con, match_ids, puuid, TARGET_QUEUE,
+        batch_size=batch_size, workers=workers, on_batch=on_batch,
     )
-    con.commit()
-
-    match_ids = get_match_ids_ranked(puuid, total=200)
-    print("Fetched ranked match IDs:", len(match_ids))
 
-    inserted = 0
-    skipped = 0
+def recompute(con, batch_size: int = 500):
+    """
+    Herberekent features van rijen met een oudere FEATURE_VERSION uit de ruwe match store.
+    Netwerk alleen voor matches die van vóór de match store dateren.
+    """
+    rows = db.stale_feature_rows(con)
+    print("Stale feature rows:", len(rows))
+
+    updated = 0
+    failed = 0
+    for i in range(0, len(rows), batch_size):
+        chunk = rows[i:i + batch_size]
+        # ophalen buiten de transactie; alleen het wegschrijven houdt de write lock vast
+        fetched, n_failed = client.get_matches(list(dict.fromkeys(mid for mid, _ in chunk)), store=get_store())
+        matches = {m["metadata"]["matchId"]: m for m in fetched if m is not None}
+        with con:
+            updated += db.recompute_features(con, chunk, matches)
+        failed += n_failed
+
+    print(f"Recomputed: {updated}, Failed: {failed}")
 
-    for match_id in match_ids:
-        if match_exists(con, match_id):
-            skipped += 1
-            continue
+def main():
+    parser = argparse.ArgumentParser(description="Ranked matches van één speler naar lol.db")
+    parser.add_argument("--backfill", action="store_true", help="volledige ranked history i.p.v. de laatste --total")
+    parser.add_argument("--total", type=int, default=None, help=f"aantal recente match IDs (zonder --backfill, standaard {DEFAULT_TOTAL})")
+    parser.add_argument("--workers", type=int, default=8, help="parallelle downloads")
+    parser.add_argument("--batch-size", type=int, default=200, help="matches per DB transactie")
+    parser.add_argument("--recompute", action="store_true", help="alleen verouderde features herberekenen uit de match store")
+    args = parser.parse_args()
+
+    con = db.connect()
+    with con:
+        db.init_schema(con)
+
+    if args.recompute:
+        recompute(con)
+        con.close()
+        return
 
-        match_json = get_match(match_id)
-        info = match_json["info"]
+    puuid = get_puuid()
+    print("PUUID:", puuid)
 
-        # Sanity: queueId moet 420 zijn (we filteren al, maar extra zekerheid)
-        if info.get("queueId") != TARGET_QUEUE:
-            continue
+    with con:
+        db.upsert_player(con, puuid, GAME_NAME, TAG_LINE)
+
+    # Hervat een onderbroken backfill zonder alle ID-pagina's opnieuw op te vragen;
+    # met expliciete --backfill/--total wordt de verse listing met de checkpoint samengevoegd
+    checkpoint = load_checkpoint(puuid)
+    explicit = args.backfill or args.total is not None
+    match_ids = []
+    if checkpoint is None or explicit:
+        total = BACKFILL_MAX_IDS if args.backfill else (args.total or DEFAULT_TOTAL)
+        match_ids = get_match_ids_ranked(puuid, total=total)
+        print("Fetched ranked match IDs:", len(match_ids))
+    if checkpoint is not None:
+        print("Resuming from checkpoint:", len(checkpoint), "IDs")
+        match_ids = list(dict.fromkeys(match_ids + checkpoint))
+
+    # per speler: een match kan al in `matches` staan via een andere getrackte speler
+    todo = db.missing_player_matches(con, puuid, match_ids)
+    skipped = len(match_ids) - len(todo)
+    save_checkpoint(puuid, todo)
+
+    t_start = time.perf_counter()
+    try:
+        stats = ingest(con, puuid, todo, batch_size=args.batch_size, workers=args.workers)
+    except KeyboardInterrupt:
+        # batches die al gecommit zijn blijven staan; de rest pakt de volgende run op
+        print("Interrupted; checkpoint kept, rerun to resume.")
+        con.close()
+        return
+
+    elapsed = time.perf_counter() - t_start
+    with con:
+        update_tilt_state(con, puuid)
+    con.close()
 
-        cur.execute(
-            "INSERT INTO matches(match_id, queue_id, game_creation, game_duration) VALUES (?, ?, ?, ?)",
-            (match_id, info.get("queueId"), info.get("gameCreation"), info.get("gameDuration")),
+    if stats["retry"]:
+        print(f"{len(stats['retry'])} matches failed; checkpoint kept, rerun to retry.")
+    else:
+        clear_checkpoint()
+    if stats["permanent"]:
+        print(f"{stats['permanent']} matches failed permanently (4xx); not retried.")
+
+    print(f"Done. Inserted: {stats['inserted']}, Skipped: {skipped}, Failed: {stats['failed']}")
+    if elapsed > 0 and todo:
+        print(
+            f"Throughput: {len(todo) / elapsed:.1f} matches/s "
+            f"(API wait {stats['api_s']:.1f}s, DB {stats['db_s']:.2f}s, total {elapsed:.1f}s)"
         )
-
-        me = find_me(match_json, puuid)
-        if me:
-            cur.execute(
-                """INSERT INTO participant_stats(
-                       match_id, puuid, champion_name, win, kills, deaths, assists, lane, role
-                   ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    match_id,
-                    puuid,
-                    me.get("championName"),
-                    1 if me.get("win") else 0,
-                    me.get("kills", 0),
-                    me.get("deaths", 0),
-                    me.get("assists", 0),
-                    me.get("lane"),
-                    me.get("role"),
-                ),
-            )
-
-        con.commit()
-        inserted += 1
-
-    con.close()
-    print(f"Done. Inserted: {inserted}, Skipped: {skipped}")
     print("DB file: lol.db")
 
 if __name__ == "__main__":
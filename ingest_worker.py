@@ -0,0 +1,120 @@
+import os
+import time
+import argparse
+from dotenv import load_dotenv
+
+from app import db
+from app.client import RiotClient
+from app.ingest import ingest_batches
+from app.tilt import update_tilt_state
+
+load_dotenv()
+API_KEY = (os.getenv("RIOT_API_KEY") or "").strip()
+ROUTING = "europe"
+
+TARGET_QUEUE = 420  # ranked solo/duo
+
+# Zelfde bovengrens als ingest_to_db.py --backfill
+BACKFILL_MAX_IDS = 20000
+
+client = RiotClient(API_KEY, routing=ROUTING)
+
+def add_player(con, riot_id: str) -> str:
+    """Voegt GameName#TAG toe aan de roster (players tabel)."""
+    game_name, tag_line = riot_id.split("#", 1)
+    puuid = client.get_puuid(game_name, tag_line)
+    with con:
+        db.upsert_player(con, puuid, game_name, tag_line)
+    return puuid
+
+def collect_needed(con, roster: list[dict], total: int, start_time: int | None = None) -> dict[str, list[str]]:
+    """
+    Per speler de match IDs (nieuwste eerst) waarvoor nog geen participant_stats rij bestaat.
+    """
+    queues = {}
+    for p in roster:
+        ids = client.get_match_ids(p["puuid"], total=total, queue=TARGET_QUEUE, start_time=start_time)
+        queues[p["puuid"]] = db.missing_player_matches(con, p["puuid"], ids)
+    return queues
+
+def fair_order(queues: dict[str, list[str]]) -> list[str]:
+    """
+    Round-robin over de spelers (elk om de beurt zijn nieuwste ontbrekende match), zodat
+    een grote backfill van één speler de verse games van anderen niet verdringt.
+    Matches die meerdere spelers nodig hebben komen er maar één keer in.
+    """
+    seen = set()
+    order = []
+    positions = {p: 0 for p in queues}
+
+    while positions:
+        for p in list(positions):
+            q = queues[p]
+            i = positions[p]
+            while i < len(q) and q[i] in seen:
+                i += 1
+            if i >= len(q):
+                del positions[p]
+                continue
+            seen.add(q[i])
+            order.append(q[i])
+            positions[p] = i + 1
+
+    return order
+
+def ingest_ids(con, match_ids: list[str], tracked: set[str], batch_size: int = 200, workers: int = 8) -> dict:
+    """
+    Haalt elke match één keer op en schrijft rijen voor elke getrackte speler in die
+    match (app.ingest, één transactie per batch).
+    """
+    return ingest_batches(
+        client, con, match_ids, tracked, TARGET_QUEUE,
+        batch_size=batch_size, workers=workers,
+        on_batch=lambda done, _: print(f"  {done}/{len(match_ids)} processed"),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Ranked matches van de hele roster (players tabel) naar lol.db")
+    parser.add_argument("--add", action="append", default=[], metavar="NAME#TAG", help="speler aan de roster toevoegen")
+    parser.add_argument("--backfill", action="store_true", help="volledige ranked history per speler")
+    parser.add_argument("--total", type=int, default=200, help="aantal recente match IDs per speler (zonder --backfill)")
+    parser.add_argument("--workers", type=int, default=8, help="parallelle downloads")
+    parser.add_argument("--batch-size", type=int, default=200, help="matches per DB transactie")
+    args = parser.parse_args()
+
+    con = db.connect()
+    with con:
+        db.init_schema(con)
+
+    for riot_id in args.add:
+        print("Added:", riot_id, add_player(con, riot_id))
+
+    roster = db.list_players(con)
+    if not roster:
+        print("Roster is leeg; voeg spelers toe met --add 'Name#TAG'.")
+        return
+
+    total = BACKFILL_MAX_IDS if args.backfill else args.total
+    queues = collect_needed(con, roster, total)
+    order = fair_order(queues)
+
+    requested = sum(len(q) for q in queues.values())
+    print(f"Players: {len(roster)} | needed (player, match) pairs: {requested} | unique matches: {len(order)}")
+
+    t_start = time.perf_counter()
+    stats = ingest_ids(con, order, {p["puuid"] for p in roster}, batch_size=args.batch_size, workers=args.workers)
+    elapsed = time.perf_counter() - t_start
+    with con:
+        for p in roster:
+            update_tilt_state(con, p["puuid"])
+    con.close()
+
+    print(f"Done. Inserted matches: {stats['inserted']}, Failed: {stats['failed']}")
+    if elapsed > 0 and order:
+        print(
+            f"Throughput: {len(order) / elapsed:.1f} matches/s "
+            f"(API wait {stats['api_s']:.1f}s, DB {stats['db_s']:.2f}s, total {elapsed:.1f}s)"
+        )
+
+if __name__ == "__main__":
+    main()
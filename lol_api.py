@@ -1,86 +1,560 @@
+import io
+import os
+import json
 import sqlite3
-from fastapi import FastAPI, Query
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import pandas as pd
+from pydantic import BaseModel, Field
+
+from app.db import FEATURE_COLUMNS, ReadOnlyPool, connect, data_version, init_schema, load_roster_tilt_frame
+from app.tilt import roster_tilt
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow export is optioneel
+    pa = None
 
 DB_PATH = "lol.db"
 TARGET_QUEUE_DEFAULT = 420
 
-app = FastAPI(title="LoL Dashboard API")
+# Connecties per worker-proces; uvicorn --workers N geeft elk proces een eigen pool
+POOL_SIZE = int(os.getenv("LOL_API_POOL_SIZE", "8"))
+
+# Max aantal gecachte responses per worker-proces
+CACHE_SIZE = int(os.getenv("LOL_API_CACHE_SIZE", "512"))
+
+# LOL_SYNC=1 start de sync daemon mee met de API (gebruik dan één uvicorn worker)
+RUN_SYNC = os.getenv("LOL_SYNC") == "1"
+
+pool: ReadOnlyPool | None = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global pool
+    # schema/migraties eerst met één schrijvende connectie; de pool zelf is read-only
+    con = connect(DB_PATH)
+    try:
+        with con:
+            init_schema(con)
+    finally:
+        con.close()
+    pool = ReadOnlyPool(DB_PATH, size=POOL_SIZE)
+
+    daemon = None
+    if RUN_SYNC:
+        from sync_daemon import build_daemon
+        daemon = build_daemon(float(os.getenv("LOL_SYNC_SHARE", "0.5")))
+        daemon.start()
+
+    yield
+
+    if daemon is not None:
+        daemon.stop()
+    pool.close()
+    pool = None
 
+app = FastAPI(title="LoL Dashboard API", lifespan=lifespan)
+
+@contextmanager
 def db():
-    con = sqlite3.connect(DB_PATH)
-    con.row_factory = sqlite3.Row
-    return con
+    # Sync handlers draaien in de threadpool van FastAPI; SQLite blokkeert, dus dat is
+    # de juiste plek. De pool voorkomt open/close per request.
+    with pool.connection() as con:
+        yield con
+
+class ResponseCache:
+    """
+    LRU van geserialiseerde JSON responses, key = (endpoint, params, data_version).
+    Zodra de data_version stijgt worden oudere entries weggegooid.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+            return body
+
+    def put(self, key, body: bytes):
+        with self._lock:
+            version = key[-1]
+            if self._version is not None and version < self._version:
+                return
+            if self._version is None or version > self._version:
+                self._items.clear()
+                self._version = version
+            self._items[key] = body
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+response_cache = ResponseCache(CACHE_SIZE)
+
+def current_version() -> int:
+    with db() as con:
+        try:
+            return data_version(con)
+        except sqlite3.OperationalError:
+            # database van vóór de meta tabel (init_db.py nog niet gedraaid)
+            return 0
+
+def cached_response(request: Request, compute, params=None) -> Response:
+    """
+    Conditional GET: 304 als If-None-Match de huidige ETag bevat, anders de response uit
+    de LRU (of compute() uitvoeren en cachen). params: cache key voor POST bodies
+    (default: de query parameters).
+    """
+    version = current_version()
+    if params is None:
+        params = tuple(sorted(request.query_params.multi_items()))
+    key = (request.url.path, params, version)
+    etag = '"' + hashlib.sha1(repr(key).encode()).hexdigest()[:20] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    sent = request.headers.get("if-none-match", "")
+    if request.method == "GET" and etag in (t.strip().removeprefix("W/") for t in sent.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key)
+    if body is None:
+        body = json.dumps(compute()).encode()
+        response_cache.put(key, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/players")
-def list_players():
-    con = db()
-    cur = con.cursor()
-    cur.execute("SELECT puuid, game_name, tag_line FROM players ORDER BY game_name")
-    rows = [dict(r) for r in cur.fetchall()]
-    con.close()
-    return rows
+def list_players(request: Request):
+    def compute():
+        with db() as con:
+            cur = con.cursor()
+            cur.execute("SELECT puuid, game_name, tag_line FROM players ORDER BY game_name")
+            rows = [dict(r) for r in cur.fetchall()]
+        return rows
+
+    return cached_response(request, compute)
 
 @app.get("/stats/summary")
 def summary(
+    request: Request,
     puuid: str = Query(...),
     queue_id: int = Query(TARGET_QUEUE_DEFAULT),
     limit: int = Query(20, ge=1, le=100),
 ):
-    con = db()
-    cur = con.cursor()
-    cur.execute("""
-        SELECT ps.win, ps.kills, ps.deaths, ps.assists
-        FROM participant_stats ps
-        JOIN matches m ON m.match_id = ps.match_id
-        WHERE ps.puuid = ? AND m.queue_id = ?
-        ORDER BY m.game_creation DESC
-        LIMIT ?
-    """, (puuid, queue_id, limit))
-    rows = cur.fetchall()
-    con.close()
-
-    games = len(rows)
-    wins = sum(r["win"] for r in rows)
-    kills = sum(r["kills"] for r in rows)
-    deaths = sum(r["deaths"] for r in rows)
-    assists = sum(r["assists"] for r in rows)
-
-    return {
-        "puuid": puuid,
-        "queue_id": queue_id,
-        "limit": limit,
-        "games": games,
-        "wins": wins,
-        "winrate": (wins / games) if games else 0,
-        "avg_kills": (kills / games) if games else 0,
-        "avg_deaths": (deaths / games) if games else 0,
-        "avg_assists": (assists / games) if games else 0,
-    }
+    def compute():
+        with db() as con:
+            cur = con.cursor()
+            # aggregatie in SQL; idx_ps_puuid_queue_creation dekt de subquery volledig
+            cur.execute("""
+                SELECT COUNT(*) AS games,
+                       COALESCE(SUM(win), 0) AS wins,
+                       COALESCE(AVG(win), 0) AS winrate,
+                       COALESCE(AVG(kills), 0) AS avg_kills,
+                       COALESCE(AVG(deaths), 0) AS avg_deaths,
+                       COALESCE(AVG(assists), 0) AS avg_assists
+                FROM (
+                    SELECT win, kills, deaths, assists
+                    FROM participant_stats
+                    WHERE puuid = ? AND queue_id = ?
+                    ORDER BY game_creation DESC
+                    LIMIT ?
+                )
+            """, (puuid, queue_id, limit))
+            r = dict(cur.fetchone())
+
+        return {
+            "puuid": puuid,
+            "queue_id": queue_id,
+            "limit": limit,
+            **r,
+        }
+
+    return cached_response(request, compute)
 
 @app.get("/stats/champions")
 def champions(
+    request: Request,
     puuid: str = Query(...),
     queue_id: int = Query(TARGET_QUEUE_DEFAULT),
     limit: int = Query(20, ge=1, le=100),
 ):
-    con = db()
-    cur = con.cursor()
-    cur.execute("""
-        SELECT ps.champion_name AS champion,
-               COUNT(*) AS games,
-               SUM(ps.win) AS wins
-        FROM participant_stats ps
-        JOIN matches m ON m.match_id = ps.match_id
-        WHERE ps.puuid = ? AND m.queue_id = ?
-        GROUP BY ps.champion_name
-        ORDER BY games DESC
-        LIMIT ?
-    """, (puuid, queue_id, limit))
-    rows = [dict(r) for r in cur.fetchall()]
-    con.close()
-
-    # voeg winrate per champ toe
-    for r in rows:
-        r["winrate"] = (r["wins"] / r["games"]) if r["games"] else 0
+    def compute():
+        with db() as con:
+            cur = con.cursor()
+            # champion_stats wordt door de ingest bijgehouden: O(champions) i.p.v. O(matches)
+            cur.execute("""
+                SELECT champion_name AS champion, games, wins
+                FROM champion_stats
+                WHERE puuid = ? AND queue_id = ?
+                ORDER BY games DESC
+                LIMIT ?
+            """, (puuid, queue_id, limit))
+            rows = [dict(r) for r in cur.fetchall()]
+
+        # voeg winrate per champ toe
+        for r in rows:
+            r["winrate"] = (r["wins"] / r["games"]) if r["games"] else 0
+
+        return rows
+
+    return cached_response(request, compute)
+
+@app.get("/stats/lifetime")
+def lifetime(
+    request: Request,
+    puuid: str = Query(...),
+    queue_id: int = Query(TARGET_QUEUE_DEFAULT),
+):
+    def compute():
+        with db() as con:
+            cur = con.cursor()
+            cur.execute("""
+                SELECT COALESCE(SUM(games), 0) AS games,
+                       COALESCE(SUM(wins), 0) AS wins,
+                       COALESCE(SUM(kills), 0) AS kills,
+                       COALESCE(SUM(deaths), 0) AS deaths,
+                       COALESCE(SUM(assists), 0) AS assists,
+                       COUNT(*) AS champions
+                FROM champion_stats
+                WHERE puuid = ? AND queue_id = ?
+            """, (puuid, queue_id))
+            r = cur.fetchone()
+
+        games = r["games"]
+
+        return {
+            "puuid": puuid,
+            "queue_id": queue_id,
+            "games": games,
+            "wins": r["wins"],
+            "champions": r["champions"],
+            "winrate": (r["wins"] / games) if games else 0,
+            "avg_kills": (r["kills"] / games) if games else 0,
+            "avg_deaths": (r["deaths"] / games) if games else 0,
+            "avg_assists": (r["assists"] / games) if games else 0,
+        }
+
+    return cached_response(request, compute)
+
+@app.get("/stats/timeseries")
+def timeseries(
+    request: Request,
+    puuid: str = Query(...),
+    queue_id: int = Query(TARGET_QUEUE_DEFAULT),
+    window: int = Query(10, ge=2, le=100),
+    min_periods: int = Query(3, ge=1),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Per game (oud → nieuw) rolling winrate/KDA/deaths per 10 over de laatste `window` games,
+    net als winrate_roll10 in het dashboard. Window functions draaien over de volledige
+    history; daarna worden de laatste `limit` games teruggegeven.
+    """
+    def compute():
+        with db() as con:
+            cur = con.cursor()
+            cur.execute("""
+                SELECT * FROM (
+                    SELECT match_id,
+                           game_creation,
+                           champion_name AS champion,
+                           win,
+                           (kills + assists) * 1.0 / MAX(deaths, 1) AS kda,
+                           deaths_per_10,
+                           CASE WHEN COUNT(*) OVER w >= ? THEN AVG(win) OVER w END AS winrate_roll,
+                           CASE WHEN COUNT(*) OVER w >= ? THEN AVG((kills + assists) * 1.0 / MAX(deaths, 1)) OVER w END AS kda_roll,
+                           CASE WHEN COUNT(deaths_per_10) OVER w >= ? THEN AVG(deaths_per_10) OVER w END AS deaths10_roll
+                    FROM participant_stats
+                    WHERE puuid = ? AND queue_id = ?
+                    WINDOW w AS (ORDER BY game_creation ROWS BETWEEN ? PRECEDING AND CURRENT ROW)
+                    ORDER BY game_creation DESC
+                    LIMIT ?
+                )
+                ORDER BY game_creation
+            """, (min_periods, min_periods, min_periods, puuid, queue_id, window - 1, limit))
+            rows = [dict(r) for r in cur.fetchall()]
+
+        return {
+            "puuid": puuid,
+            "queue_id": queue_id,
+            "window": window,
+            "games": rows,
+        }
+
+    return cached_response(request, compute)
+
+class BatchQuery(BaseModel):
+    """
+    Body voor de batch endpoints; POST omdat honderden puuids niet in een URL passen.
+    """
+    puuids: list[str] = Field(..., min_length=1, max_length=1000)
+    queue_id: int = TARGET_QUEUE_DEFAULT
+    limit: int = Field(20, ge=1, le=100)
+    champion: str | None = None
+
+@app.post("/stats/batch/summary")
+def batch_summary(request: Request, q: BatchQuery):
+    """
+    /stats/summary voor een hele roster in één grouped query: ROW_NUMBER() per puuid
+    beperkt tot de laatste `limit` games (optioneel alleen op `champion`).
+    """
+    def compute():
+        with db() as con:
+            cur = con.cursor()
+            cur.execute("""
+                WITH ranked AS (
+                    SELECT puuid, win, kills, deaths, assists,
+                           ROW_NUMBER() OVER (PARTITION BY puuid ORDER BY game_creation DESC) AS rn
+                    FROM participant_stats
+                    WHERE puuid IN (SELECT value FROM json_each(?))
+                      AND queue_id = ?
+                      AND (? IS NULL OR champion_name = ?)
+                )
+                SELECT puuid,
+                       COUNT(*) AS games,
+                       SUM(win) AS wins,
+                       AVG(win) AS winrate,
+                       AVG(kills) AS avg_kills,
+                       AVG(deaths) AS avg_deaths,
+                       AVG(assists) AS avg_assists
+                FROM ranked
+                WHERE rn <= ?
+                GROUP BY puuid
+            """, (json.dumps(q.puuids), q.queue_id, q.champion, q.champion, q.limit))
+            found = {r["puuid"]: dict(r) for r in cur.fetchall()}
+
+        empty = {"games": 0, "wins": 0, "winrate": 0, "avg_kills": 0, "avg_deaths": 0, "avg_assists": 0}
+        return {
+            "queue_id": q.queue_id,
+            "limit": q.limit,
+            "champion": q.champion,
+            "players": {
+                p: {k: v for k, v in found.get(p, empty).items() if k != "puuid"}
+                for p in q.puuids
+            },
+        }
+
+    return cached_response(request, compute, params=q.model_dump_json())
 
+@app.post("/stats/batch/champions")
+def batch_champions(request: Request, q: BatchQuery):
+    """
+    /stats/champions voor een hele roster: top `limit` champions per puuid uit champion_stats.
+    """
+    def compute():
+        with db() as con:
+            cur = con.cursor()
+            cur.execute("""
+                SELECT puuid, champion, games, wins FROM (
+                    SELECT puuid,
+                           champion_name AS champion,
+                           games,
+                           wins,
+                           ROW_NUMBER() OVER (PARTITION BY puuid ORDER BY games DESC) AS rn
+                    FROM champion_stats
+                    WHERE puuid IN (SELECT value FROM json_each(?))
+                      AND queue_id = ?
+                      AND (? IS NULL OR champion_name = ?)
+                )
+                WHERE rn <= ?
+                ORDER BY puuid, rn
+            """, (json.dumps(q.puuids), q.queue_id, q.champion, q.champion, q.limit))
+            rows = cur.fetchall()
+
+        players = {p: [] for p in q.puuids}
+        for r in rows:
+            players[r["puuid"]].append({
+                "champion": r["champion"],
+                "games": r["games"],
+                "wins": r["wins"],
+                "winrate": (r["wins"] / r["games"]) if r["games"] else 0,
+            })
+
+        return {"queue_id": q.queue_id, "limit": q.limit, "champion": q.champion, "players": players}
+
+    return cached_response(request, compute, params=q.model_dump_json())
+
+@app.get("/sync/status")
+def sync_status():
+    """
+    Laatste sync per speler (sync daemon). Niet gecachet: verandert ook zonder nieuwe data.
+    """
+    with db() as con:
+        cur = con.cursor()
+        try:
+            cur.execute("""
+                SELECT p.puuid, p.game_name, p.tag_line,
+                       s.last_sync, s.last_new_game, s.next_poll, s.interval_s, s.games_added, s.last_error
+                FROM players p
+                LEFT JOIN sync_state s ON s.puuid = p.puuid
+                ORDER BY p.game_name
+            """)
+        except sqlite3.OperationalError:
+            # database van vóór de sync_state tabel
+            return []
+        rows = [dict(r) for r in cur.fetchall()]
     return rows
+
+@app.get("/tilt/state")
+def tilt_state(request: Request, puuid: str = Query(...)):
+    """
+    Opgeslagen tilt staat (app.tilt.TiltTracker, bijgewerkt door ingest/sync); geen history nodig.
+    """
+    def compute():
+        with db() as con:
+            try:
+                row = con.execute(
+                    "SELECT games, level, score, result, updated_at FROM tilt_state WHERE puuid = ?", (puuid,)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                row = None
+        if row is None:
+            raise HTTPException(status_code=404, detail="Geen tilt staat voor deze speler")
+
+        return {
+            "puuid": puuid,
+            "games": row["games"],
+            "updated_at": row["updated_at"],
+            "tilt": json.loads(row["result"]) if row["result"] else None,
+        }
+
+    return cached_response(request, compute)
+
+@app.get("/tilt/roster")
+def tilt_roster(
+    request: Request,
+    queue_id: int = Query(TARGET_QUEUE_DEFAULT),
+    recent_n: int = Query(7, ge=3, le=20),
+    baseline_n: int = Query(60, ge=10, le=200),
+):
+    """
+    Tilt van de hele roster in één gegroepeerde pass (app.tilt.roster_tilt), hoogste tilt eerst.
+    """
+    def compute():
+        with db() as con:
+            rows = load_roster_tilt_frame(con, recent_n + max(baseline_n, 10), queue_id)
+
+        table = roster_tilt(pd.DataFrame(rows), recent_n=recent_n, baseline_n=baseline_n)
+        # NaN => null
+        return json.loads(table.to_json(orient="records", double_precision=15))
+
+    return cached_response(request, compute)
+
+# Kolommen van /export/features → Arrow type
+EXPORT_COLUMNS = {
+    "match_id": "string",
+    "puuid": "string",
+    "queue_id": "int64",
+    "game_creation": "int64",
+    "champion": "string",
+    "win": "int64",
+    "kills": "int64",
+    "deaths": "int64",
+    "assists": "int64",
+    "lane": "string",
+    "role": "string",
+    **{c: ("int64" if t == "INTEGER" else "float64") for c, t in FEATURE_COLUMNS.items()},
+}
+
+EXPORT_BATCH = 5000
+
+def _export_rows(puuid, queue_id, start_time, end_time):
+    """
+    Voert de query uit en haalt de eerste batch op vóórdat de response begint, zodat
+    fouten (bv. een ongemigreerde database) een echte 5xx geven i.p.v. een afgekapte 200.
+    Returns: (generator van row-batches via fetchmany, cleanup callback).
+    """
+    where = []
+    params = []
+    if puuid is not None:
+        where.append("puuid = ?")
+        params.append(puuid)
+    if queue_id:
+        where.append("queue_id = ?")
+        params.append(queue_id)
+    if start_time is not None:
+        where.append("game_creation >= ?")
+        params.append(start_time)
+    if end_time is not None:
+        where.append("game_creation < ?")
+        params.append(end_time)
+
+    cols = ", ".join("champion_name AS champion" if c == "champion" else c for c in EXPORT_COLUMNS)
+    sql = f"SELECT {cols} FROM participant_stats"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # alleen per speler sorteren: dat is de volgorde van idx_ps_puuid_queue_creation;
+    # zonder puuid zou ORDER BY een volledige sort zijn (dan in opslagvolgorde)
+    if puuid is not None:
+        sql += " ORDER BY queue_id, game_creation"
+
+    stack = ExitStack()
+    con = stack.enter_context(db())
+    try:
+        cur = con.execute(sql, params)
+        first = cur.fetchmany(EXPORT_BATCH)
+    except Exception:
+        stack.close()
+        raise
+
+    def batches():
+        try:
+            rows = first
+            while rows:
+                yield rows
+                rows = cur.fetchmany(EXPORT_BATCH)
+        finally:
+            stack.close()
+
+    return batches(), stack.close
+
+def _ndjson(batches):
+    for rows in batches:
+        yield "".join(json.dumps(dict(r)) + "\n" for r in rows).encode()
+
+def _arrow(batches):
+    schema = pa.schema([(c, getattr(pa, t)()) for c, t in EXPORT_COLUMNS.items()])
+    buf = io.BytesIO()
+    with pa.ipc.new_stream(buf, schema) as writer:
+        for rows in batches:
+            columns = [[r[i] for r in rows] for i in range(len(EXPORT_COLUMNS))]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    # end-of-stream marker
+    yield buf.getvalue()
+
+@app.get("/export/features")
+def export_features(
+    format: str = Query("ndjson", pattern="^(ndjson|arrow)$"),
+    puuid: str | None = Query(None),
+    queue_id: int = Query(TARGET_QUEUE_DEFAULT, ge=0, description="0 = alle queues"),
+    start_time: int | None = Query(None, description="game_creation >= (Unix ms)"),
+    end_time: int | None = Query(None, description="game_creation < (Unix ms)"),
+):
+    """
+    Streamt alle match features (geen limit) als NDJSON of Arrow IPC stream.
+    Met puuid gesorteerd op (queue_id, game_creation), anders in opslagvolgorde.
+    """
+    if format == "arrow" and pa is None:
+        raise HTTPException(status_code=501, detail="pyarrow is niet geïnstalleerd")
+
+    batches, cleanup = _export_rows(puuid, queue_id, start_time, end_time)
+    # cleanup ook als de client wegvalt voordat de stream begint (idempotent)
+    background = BackgroundTask(cleanup)
+
+    if format == "arrow":
+        return StreamingResponse(_arrow(batches), media_type="application/vnd.apache.arrow.stream", background=background)
+
+    return StreamingResponse(_ndjson(batches), media_type="application/x-ndjson", background=background)
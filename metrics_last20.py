@@ -1,9 +1,10 @@
 import os
-import time
-import requests
 from collections import Counter, defaultdict
 from dotenv import load_dotenv
 
+from app.client import RiotClient
+from app.store import get_store
+
 load_dotenv()
 
 API_KEY = (os.getenv("RIOT_API_KEY") or "").strip()
@@ -12,52 +13,15 @@ ROUTING = "europe"
 GAME_NAME = "Evil Wim"
 TAG_LINE = "jotul"
 
-headers = {"X-Riot-Token": API_KEY}
-
-def riot_get(url: str, params=None, timeout=20, max_retries=5):
-    """GET met simpele 429 handling."""
-    for _ in range(max_retries):
-        r = requests.get(url, headers=headers, params=params, timeout=timeout)
-        if r.status_code == 429:
-            retry_after = int(r.headers.get("Retry-After", "1"))
-            time.sleep(retry_after)
-            continue
-        return r
-    return r
+client = RiotClient(API_KEY, routing=ROUTING)
 
 
 def get_match_ids(puuid: str, total: int = 200):
-    url = f"https://{ROUTING}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
-
-    ids = []
-    start = 0
-    while len(ids) < total:
-        batch_count = min(100, total - len(ids))
-
-        r = riot_get(url, params={
-            "start": start,
-            "count": batch_count,
-            "queue": 420   # <- deze regel toegevoegd
-        })
-
-        if r.status_code != 200:
-            raise RuntimeError(f"get_match_ids failed: {r.status_code} {r.text}")
-
-        batch = r.json()
-        if not batch:
-            break
-
-        ids.extend(batch)
-        start += batch_count
-
-    return ids
+    return client.get_match_ids(puuid, total=total, queue=420)
 
 def get_match(match_id: str):
-    url = f"https://{ROUTING}.api.riotgames.com/lol/match/v5/matches/{match_id}"
-    r = riot_get(url)
-    if r.status_code != 200:
-        raise RuntimeError(f"get_match failed for {match_id}: {r.status_code} {r.text}")
-    return r.json()
+    """Match uit de gedeelde match store; download alleen als hij ontbreekt."""
+    return client.get_match(match_id, store=get_store())
 
 def find_me(match_json: dict, puuid: str) -> dict | None:
     for p in match_json["info"]["participants"]:
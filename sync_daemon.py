@@ -0,0 +1,38 @@
+import os
+import argparse
+from dotenv import load_dotenv
+
+from app.client import RiotClient
+from app.ratelimit import RateLimiter
+from app.sync import MAX_INTERVAL, MIN_INTERVAL, SyncDaemon
+
+load_dotenv()
+API_KEY = (os.getenv("RIOT_API_KEY") or "").strip()
+ROUTING = "europe"
+
+def build_daemon(share: float, min_interval: int = MIN_INTERVAL, max_interval: int = MAX_INTERVAL) -> SyncDaemon:
+    """Sync daemon die maximaal `share` van het rate budget van de key gebruikt."""
+    client = RiotClient(API_KEY, routing=ROUTING, limiter=RateLimiter(share=share))
+    return SyncDaemon(client, min_interval=min_interval, max_interval=max_interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Houdt lol.db warm door de roster periodiek te pollen")
+    parser.add_argument("--share", type=float, default=float(os.getenv("LOL_SYNC_SHARE", "0.5")), help="deel van het API rate budget (0-1)")
+    parser.add_argument("--min-interval", type=int, default=MIN_INTERVAL)
+    parser.add_argument("--max-interval", type=int, default=MAX_INTERVAL)
+    parser.add_argument("--once", action="store_true", help="één ronde pollen en stoppen")
+    args = parser.parse_args()
+
+    daemon = build_daemon(args.share, args.min_interval, args.max_interval)
+    if args.once:
+        daemon.run_once()
+        return
+
+    print(f"Sync daemon running (share {args.share:.0%}); Ctrl-C to stop.")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()